@@ -1,15 +1,36 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
-from werkzeug.security import generate_password_hash
-import bcrypt
-import qrcode
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file, Response, stream_with_context
+from werkzeug.middleware.proxy_fix import ProxyFix
 import io
-import base64
+import hashlib
+import json
+import math
+import re
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+import multiprocessing
 from datetime import datetime
 import secrets
 import os
+import sys
 import csv
 from io import StringIO
 from dotenv import load_dotenv
+from cache import LRUCache
+from versions import DataVersions
+from rate_limit import TokenBucketLimiter
+from zip_stream import ZipStream
+import qr_sheet
+from completion_queue import CompletionWriter
+from completion_feed import CompletionFeed
+from student_import import parse_student_csv, rows_from_json, validate_student_rows
+from repositories import LazyRepository, create_repository
+from repositories.round_trips import round_trips
+from metrics import RequestMetrics, timed_segment
+from logging_config import configure_logging, mask_email, SAMPLED
 
 # Load environment variables
 load_dotenv()
@@ -17,30 +38,601 @@ load_dotenv()
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', secrets.token_hex(16))
 
-# Initialize Supabase client
+# Behind a reverse proxy (Vercel, nginx) remote_addr is the proxy; trust
+# X-Forwarded-* from exactly this many hops so rate limits see the client
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '0'))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS,
+                            x_host=TRUSTED_PROXY_HOPS)
+
+# Data backend: 'supabase' (default) or 'sqlite' for local development
+DATA_BACKEND = os.getenv('DATA_BACKEND', 'supabase')
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 
-# Only print debug info in development
+logger = configure_logging()
+
+# Only log debug info in development
 if os.getenv('FLASK_ENV') != 'production':
-    print(f"SUPABASE_URL: {SUPABASE_URL}")
-    print(f"SUPABASE_KEY: {'*' * 20 if SUPABASE_KEY else 'NOT SET'}")
+    logger.info("DATA_BACKEND: %s", DATA_BACKEND)
+    logger.info("SUPABASE_URL: %s", SUPABASE_URL)
+    logger.info("SUPABASE_KEY: %s", '*' * 20 if SUPABASE_KEY else 'NOT SET')
 
-if not SUPABASE_URL or not SUPABASE_KEY:
+if DATA_BACKEND == 'supabase' and (not SUPABASE_URL or not SUPABASE_KEY):
     error_msg = "❌ ERROR: Missing Supabase credentials!"
-    print(error_msg)
+    logger.error(error_msg)
     if os.getenv('FLASK_ENV') != 'production':
         exit(1)
 
-try:
-    from supabase import create_client, Client
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    if os.getenv('FLASK_ENV') != 'production':
-        print("✅ Supabase client initialized successfully")
-except Exception as e:
-    print(f"❌ Failed to initialize Supabase: {e}")
-    if os.getenv('FLASK_ENV') != 'production':
-        exit(1)
+def create_backend():
+    try:
+        backend = create_repository(DATA_BACKEND)
+        logger.info("%s backend initialized successfully", DATA_BACKEND)
+        return backend
+    except Exception as e:
+        logger.error("Failed to initialize %s backend: %s", DATA_BACKEND, e)
+        raise
+
+# The backend client (and its libraries) is created on first use and then
+# reused for the life of the process, keeping it off the cold-start path
+repo = LazyRepository(create_backend)
+
+# Optional request/database timing metrics. When disabled no hooks or
+# round trip listeners are installed.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+request_metrics = None
+if METRICS_ENABLED:
+    request_metrics = RequestMetrics()
+    request_metrics.init_app(app)
+    round_trips.add_listener(request_metrics.observe_round_trip)
+
+# Page size for streamed exports (PostgREST's default max-rows)
+EXPORT_PAGE_SIZE = 1000
+
+def format_completed_at(completed_at):
+    """Format a completion timestamp for CSV output, keeping unparseable values as-is"""
+    try:
+        dt = datetime.fromisoformat(completed_at.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return completed_at
+    return dt.strftime('%Y-%m-%d %H:%M')
+
+def csv_line(row):
+    output = StringIO()
+    csv.writer(output).writerow(row)
+    return output.getvalue()
+
+def completion_rate(completed, possible):
+    return round(completed / possible, 4) if possible else 0.0
+
+def generate_class_csv(class_id, students, exercises):
+    """Stream the comprehensive class CSV one student row at a time.
+    
+    Students and completions are both ordered by student id, so each student's
+    completions are consumed from the paged completion stream as a merge join
+    and only one student's row is held in memory at a time.
+    """
+    exercise_ids = [ex['id'] for ex in exercises]
+    total_exercises = len(exercise_ids)
+    
+    # Header row: Student Name, Email, then each exercise name
+    yield csv_line(['Student Name', 'Email'] + [ex['name'] for ex in exercises] + ['Total Completed', 'Completion Rate'])
+    
+    completions = repo.completions.iter_for_class(class_id, EXPORT_PAGE_SIZE)
+    pending = next(completions, None)
+    
+    for student in students:
+        # Skip completions belonging to students no longer in the roster
+        while pending is not None and pending['student_id'] < student['id']:
+            pending = next(completions, None)
+        
+        completed = {}
+        while pending is not None and pending['student_id'] == student['id']:
+            completed[pending['exercise_id']] = format_completed_at(pending['completed_at'])
+            pending = next(completions, None)
+        
+        completed_count = sum(1 for exercise_id in exercise_ids if exercise_id in completed)
+        rate = f"{(completed_count / total_exercises * 100):.1f}%"
+        yield csv_line(
+            [student['name'], student['email']]
+            + [completed.get(exercise_id, '') for exercise_id in exercise_ids]
+            + [f"{completed_count}/{total_exercises}", rate]
+        )
+    
+    # Add summary row
+    yield csv_line([])
+    yield csv_line(['Summary Statistics'])
+    yield csv_line(['Total Students', len(students)])
+    yield csv_line(['Total Exercises', total_exercises])
+    logger.info("Exported comprehensive CSV for class %s", class_id)
+
+# Semester export: classes are fetched and rendered to CSV on a shared pool
+# of EXPORT_WORKERS threads, with at most EXPORT_WORKERS * 2 classes ahead
+# of the ZIP being streamed. Each CSV spills from memory to a temporary
+# file past EXPORT_SPOOL_BYTES, so memory stays bounded for any number of
+# classes.
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '4'))
+EXPORT_SPOOL_BYTES = 1024 * 1024
+EXPORT_READ_SIZE = 64 * 1024
+
+export_pool = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export')
+
+def bounded_map(executor, fn, items, window):
+    """Like executor.map, in order, but with at most `window` calls submitted ahead"""
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # The download was abandoned: don't start the classes still queued
+        for future in pending:
+            future.cancel()
+
+def export_filename(class_info):
+    safe_name = re.sub(r'[^A-Za-z0-9._-]+', '_', class_info['name']).strip('_') or 'class'
+    return f"{class_info['id']}_{safe_name}_all_exercises.csv"
+
+def export_class_file(class_id):
+    """Fetch a class and render its comprehensive CSV into a spooled file.
+    
+    Returns (class_info, stats, file), where file is None for a class without
+    exercises, or None if the class doesn't exist.
+    """
+    class_info = repo.classes.get(class_id)
+    if not class_info:
+        return None
+    
+    stats = repo.classes.stats(class_id) or {'student_count': 0, 'exercise_count': 0, 'completion_count': 0}
+    exercises = repo.exercises.list_for_class(class_id)
+    if not exercises:
+        return class_info, stats, None
+    
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    for line in generate_class_csv(class_id, repo.students.roster(class_id), exercises):
+        spool.write(line.encode('utf-8'))
+    spool.seek(0)
+    return class_info, stats, spool
+
+def generate_semester_zip(class_ids):
+    """Stream a ZIP with one comprehensive CSV per class and a roll-up sheet"""
+    archive = ZipStream()
+    summary = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    summary.write(csv_line(['Class', 'Code', 'Students', 'Exercises', 'Completions', 'Completion Rate']).encode('utf-8'))
+    totals = {'classes': 0, 'student_count': 0, 'exercise_count': 0, 'completion_count': 0, 'possible': 0}
+    
+    for result in bounded_map(export_pool, export_class_file, class_ids, EXPORT_WORKERS * 2):
+        if result is None:
+            continue
+        class_info, stats, spool = result
+        
+        possible = stats['student_count'] * stats['exercise_count']
+        summary.write(csv_line([
+            class_info['name'],
+            class_info['code'],
+            stats['student_count'],
+            stats['exercise_count'],
+            stats['completion_count'],
+            f"{completion_rate(stats['completion_count'], possible) * 100:.1f}%"
+        ]).encode('utf-8'))
+        totals['classes'] += 1
+        totals['possible'] += possible
+        for key in ('student_count', 'exercise_count', 'completion_count'):
+            totals[key] += stats[key]
+        
+        if spool is not None:
+            with spool:
+                yield from archive.write_file(
+                    export_filename(class_info),
+                    iter(lambda: spool.read(EXPORT_READ_SIZE), b'')
+                )
+    
+    summary.write(csv_line([]).encode('utf-8'))
+    summary.write(csv_line([
+        f"Total ({totals['classes']} classes)",
+        '',
+        totals['student_count'],
+        totals['exercise_count'],
+        totals['completion_count'],
+        f"{completion_rate(totals['completion_count'], totals['possible']) * 100:.1f}%"
+    ]).encode('utf-8'))
+    summary.seek(0)
+    with summary:
+        yield from archive.write_file('semester_summary.csv', iter(lambda: summary.read(EXPORT_READ_SIZE), b''))
+    
+    yield archive.close()
+    logger.info("Exported semester archive for %d classes", totals['classes'])
+
+# QR code rendering. The PNG depends only on the completion URL, so rendered
+# images are kept in a bounded LRU cache keyed by (exercise id, URL).
+QR_VERSION = 1
+QR_BOX_SIZE = 10
+QR_BORDER = 5
+QR_CACHE_SIZE = int(os.getenv('QR_CACHE_SIZE', '256'))
+QR_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+qr_cache = LRUCache(maxsize=QR_CACHE_SIZE)
+
+def completion_url(qr_token):
+    return request.host_url + f'complete/{qr_token}'
+
+def render_qr_png(qr_url):
+    # qrcode pulls in Pillow; only admin QR requests need it
+    return qr_sheet.render_qr_png(qr_url, QR_VERSION, QR_BOX_SIZE, QR_BORDER)
+
+def get_qr_png(exercise_id, qr_url):
+    with timed_segment('qr'):
+        return qr_cache.get_or_set((exercise_id, qr_url), lambda: render_qr_png(qr_url))
+
+# Printable QR sheets render a class's codes in parallel in worker processes
+# (QR encoding is CPU-bound and holds the GIL). The pool is started on the
+# first sheet request; where processes can't be started, codes are rendered
+# in the request thread instead.
+QR_SHEET_WORKERS = int(os.getenv('QR_SHEET_WORKERS', str(min(4, os.cpu_count() or 1))))
+QR_SHEET_FORMATS = {'pdf': 'application/pdf', 'png': 'image/png'}
+
+qr_pool = None
+qr_pool_lock = threading.Lock()
+
+def get_qr_pool():
+    global qr_pool
+    with qr_pool_lock:
+        if qr_pool is None:
+            # spawn, not fork: this process already runs threads
+            qr_pool = ProcessPoolExecutor(max_workers=QR_SHEET_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return qr_pool
+
+def render_qr_pngs(codes):
+    """Render [(exercise_id, qr_url)] to PNGs, in order, using the QR cache
+    and rendering the misses in parallel"""
+    global qr_pool
+    pngs = [qr_cache.get(key) for key in codes]
+    missing = [i for i, png in enumerate(pngs) if png is None]
+    if not missing:
+        return pngs
+    
+    urls = [codes[i][1] for i in missing]
+    try:
+        render = partial(qr_sheet.render_qr_png, version=QR_VERSION, box_size=QR_BOX_SIZE, border=QR_BORDER)
+        rendered = list(get_qr_pool().map(render, urls))
+    except (OSError, NotImplementedError, BrokenProcessPool) as e:
+        logger.warning("QR process pool unavailable, rendering in-process: %s", e)
+        with qr_pool_lock:
+            qr_pool = None
+        rendered = [render_qr_png(url) for url in urls]
+    
+    for i, png in zip(missing, rendered):
+        qr_cache.set(codes[i], png)
+        pngs[i] = png
+    return pngs
+
+def qr_etag(qr_url):
+    settings = f'{QR_VERSION}:{QR_BOX_SIZE}:{QR_BORDER}:{qr_url}'
+    return hashlib.sha256(settings.encode('utf-8')).hexdigest()
+
+def evict_qr_codes(exercise_id):
+    qr_cache.discard_where(lambda key, _: key[0] == exercise_id)
+
+# QR token -> (exercise, class) lookups for the student completion pages.
+# Exercises never change after creation, so a scanning burst only needs one
+# database query per exercise; the TTL bounds staleness across workers.
+EXERCISE_CACHE_SIZE = int(os.getenv('EXERCISE_CACHE_SIZE', '1024'))
+EXERCISE_CACHE_TTL = int(os.getenv('EXERCISE_CACHE_TTL', '300'))
+
+exercise_cache = LRUCache(maxsize=EXERCISE_CACHE_SIZE, ttl=EXERCISE_CACHE_TTL)
+
+def get_exercise_by_token(token):
+    """Get (exercise, class_info) for a QR token, or (None, None) if it doesn't exist"""
+    cached = exercise_cache.get(token)
+    if cached is not None:
+        return cached
+    
+    exercise, class_info = repo.exercises.get_by_token(token)
+    if not exercise:
+        return None, None
+    
+    exercise_cache.set(token, (exercise, class_info))
+    return exercise, class_info
+
+def invalidate_exercise(exercise_id):
+    exercise_cache.discard_where(lambda _, entry: entry[0]['id'] == exercise_id)
+    completed_cache.pop(exercise_id)
+
+def invalidate_class_exercises(class_id):
+    exercise_cache.discard_where(lambda _, entry: entry[0]['class_id'] == class_id)
+
+# Per-class roster index (lowercased email -> student) used to validate
+# completion emails without a database query per submission
+ROSTER_CACHE_SIZE = int(os.getenv('ROSTER_CACHE_SIZE', '256'))
+ROSTER_CACHE_TTL = int(os.getenv('ROSTER_CACHE_TTL', '120'))
+
+roster_cache = LRUCache(maxsize=ROSTER_CACHE_SIZE, ttl=ROSTER_CACHE_TTL)
+
+def roster_index(students):
+    return {
+        s['email'].strip().lower(): {'id': s['id'], 'name': s['name']}
+        for s in students
+    }
+
+def get_class_roster(class_id):
+    """Get {email: {'id', 'name'}} for every student in a class, loaded in one query"""
+    return roster_cache.get_or_set(class_id, lambda: roster_index(repo.students.roster(class_id)))
+
+def invalidate_roster(class_id):
+    roster_cache.pop(class_id)
+
+# Students added on another worker aren't in this worker's cached roster,
+# so a miss reloads the class's roster before answering "not found", at
+# most once per ROSTER_RELOAD_INTERVAL seconds per class
+ROSTER_RELOAD_INTERVAL = float(os.getenv('ROSTER_RELOAD_INTERVAL', '5'))
+
+roster_reloads = TokenBucketLimiter(capacity=1, rate=1 / ROSTER_RELOAD_INTERVAL, maxsize=ROSTER_CACHE_SIZE)
+
+def find_student(class_id, email):
+    """Look an email up in the class roster, reloading a cached roster once on a miss"""
+    roster = roster_cache.get(class_id)
+    if roster is None:
+        return get_class_roster(class_id).get(email)
+    student = roster.get(email)
+    if student is None and not roster_reloads.take(class_id):
+        invalidate_roster(class_id)
+        student = get_class_roster(class_id).get(email)
+    return student
+
+# Optional write-behind mode for completions: validated completions are
+# queued and inserted in batches instead of one insert per request
+COMPLETION_WRITE_BEHIND = os.getenv('COMPLETION_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+
+# Ids of the students who have completed each exercise. In write-behind
+# mode repeat submissions are answered from here: the queue only knows
+# about rows it hasn't written yet, and insert_many() silently skips
+# duplicates. Queued completions are added as they are accepted.
+completed_cache = LRUCache(maxsize=EXERCISE_CACHE_SIZE, ttl=ROSTER_CACHE_TTL)
+completed_lock = threading.Lock()
+
+def get_completed_students(exercise_id):
+    """Get the set of student ids that have completed an exercise, loaded in one query"""
+    def load():
+        # Queued rows first: a row written in between is then in the query result
+        pending = completion_writer.pending_students(exercise_id)
+        return pending | set(repo.completions.student_ids_for_exercise(exercise_id))
+    return completed_cache.get_or_set(exercise_id, load)
+
+def forget_completions(rows):
+    """Take completions the write-behind queue gave up on out of completed_cache"""
+    with completed_lock:
+        for row in rows:
+            completed = completed_cache.get(row['exercise_id'])
+            if completed is not None:
+                completed.discard(row['student_id'])
+
+# Queued rows carry their exercise's class_id so the class's data version
+# can be bumped once they are written; it isn't a completion column
+COMPLETION_ROW_COLUMNS = ('student_id', 'exercise_id', 'student_email', 'completed_at')
+
+def write_completions(rows):
+    repo.completions.insert_many([{column: row[column] for column in COMPLETION_ROW_COLUMNS} for row in rows])
+
+def completions_written(rows):
+    # Bumped only now: a dashboard GET while the rows were queued must not
+    # pair the new version with the old counts
+    for class_id in {row['class_id'] for row in rows}:
+        data_versions.bump(class_id)
+
+completion_writer = CompletionWriter(
+    write_completions,
+    max_batch=int(os.getenv('COMPLETION_BATCH_SIZE', '100')),
+    flush_interval=int(os.getenv('COMPLETION_FLUSH_MS', '200')) / 1000,
+    max_queue=int(os.getenv('COMPLETION_QUEUE_SIZE', '5000')),
+    max_retries=int(os.getenv('COMPLETION_MAX_RETRIES', '3')),
+    on_written=completions_written,
+    on_dropped=forget_completions
+) if COMPLETION_WRITE_BEHIND else None
+
+# Live completion streams: accepted completions are published per exercise
+# to the clients connected to /api/exercises/<id>/completions/stream, which
+# asgi.py serves. Streams end after COMPLETION_STREAM_MAX_AGE seconds and
+# the browser reconnects from its last completion id, which also picks up
+# completions accepted by other processes.
+COMPLETION_STREAM_MAX_AGE = int(os.getenv('COMPLETION_STREAM_MAX_AGE', '60'))
+COMPLETION_STREAM_KEEPALIVE = 15
+
+completion_feed = CompletionFeed()
+
+def sse_event(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+def completion_stream_event(event, last_id):
+    """Return (SSE text, new cursor) for a feed event; the text is None for
+    a completion already sent in the snapshot"""
+    if event['id'] is None:
+        return sse_event('completion', event), last_id
+    if last_id is not None and event['id'] <= last_id:
+        return None, last_id
+    return sse_event('completion', event, event['id']), event['id']
+
+# Login protection: attempts are rate limited per client IP before any
+# lookup or password check, and failed password checks are charged to a
+# larger, slower per-username bucket so guessing spread over many IPs is
+# still throttled (successful logins never drain it, so the admin can get in
+# once an attack stops), bcrypt runs on a small bounded pool so login
+# traffic can't occupy every worker's CPU, and admin rows (including unknown
+# usernames) are cached between attempts
+LOGIN_BURST = int(os.getenv('LOGIN_BURST', '5'))
+LOGIN_RATE_PER_MINUTE = float(os.getenv('LOGIN_RATE_PER_MINUTE', '5'))
+LOGIN_USER_BURST = int(os.getenv('LOGIN_USER_BURST', '20'))
+LOGIN_USER_FAILURES_PER_HOUR = float(os.getenv('LOGIN_USER_FAILURES_PER_HOUR', '30'))
+BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', '2'))
+BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', '8'))
+ADMIN_CACHE_TTL = int(os.getenv('ADMIN_CACHE_TTL', '300'))
+
+login_limiter = TokenBucketLimiter(capacity=LOGIN_BURST, rate=LOGIN_RATE_PER_MINUTE / 60)
+failed_login_limiter = TokenBucketLimiter(capacity=LOGIN_USER_BURST, rate=LOGIN_USER_FAILURES_PER_HOUR / 3600)
+admin_cache = LRUCache(maxsize=64, ttl=ADMIN_CACHE_TTL)
+bcrypt_pool = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix='bcrypt')
+bcrypt_slots = threading.BoundedSemaphore(BCRYPT_WORKERS + BCRYPT_MAX_PENDING)
+
+def get_admin(username):
+    """Get the admin row for a username, or None"""
+    admin = admin_cache.get(username)
+    if admin is None:
+        # Unknown usernames are cached as {} so repeated failures skip the query
+        admin = repo.admins.get_by_username(username) or {}
+        admin_cache.set(username, admin)
+    return admin or None
+
+def check_password(password, password_hash):
+    """Verify a password on the bcrypt pool; returns None if the pool is saturated"""
+    import bcrypt
+    
+    if not bcrypt_slots.acquire(blocking=False):
+        return None
+    try:
+        return bcrypt_pool.submit(bcrypt.checkpw, password, password_hash).result()
+    finally:
+        bcrypt_slots.release()
+
+def retry_later(message, status, retry_after):
+    response = jsonify({'success': False, 'message': message})
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, status
+
+# Rows per insert request for bulk student imports
+BULK_INSERT_CHUNK_SIZE = 500
+
+# Keyset pagination for list endpoints: ?limit=N&after=<id of the last row
+# seen>, answered as {'items': [...], 'next_cursor': <id or null>}
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', '100'))
+MAX_PAGE_SIZE = 500
+
+def page_params():
+    """Get (after, limit) from the query string, with limit clamped to MAX_PAGE_SIZE"""
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return request.args.get('after', type=int), max(1, min(limit, MAX_PAGE_SIZE))
+
+def page_of(rows, limit):
+    """Build a page from up to limit + 1 rows fetched after the cursor"""
+    items = rows[:limit]
+    return {
+        'items': items,
+        'next_cursor': items[-1]['id'] if len(rows) > limit else None
+    }
+
+# Versions of the admin dashboard data: CLASS_LIST for the class list
+# (including student counts) and the class id for everything in a class.
+# Write paths bump them; GETs answer If-None-Match with a 304 when unchanged.
+DATA_VERSION_TTL = int(os.getenv('DATA_VERSION_TTL', '120'))
+CLASS_LIST = 'classes'
+
+data_versions = DataVersions(ttl=DATA_VERSION_TTL)
+
+def data_etag(*keys):
+    """Weak ETag for the current request, from the versions of the data it reads"""
+    tag = data_versions.etag(*keys)
+    if request.query_string:
+        # Each page of a paginated list is its own representation
+        tag += '-' + hashlib.sha256(request.query_string).hexdigest()[:12]
+    return tag
+
+def not_modified(etag):
+    """Return a 304 response if the client already has this version, else None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+def with_etag(response, etag):
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def queue_completion(exercise, student, email, completed):
+    """Submit a validated completion to the write-behind queue.
+
+    `completed` is get_completed_students() for the exercise. Returns a
+    (body, status) response, or None when the completion has to be recorded
+    synchronously (queue full).
+    """
+    completed_at = datetime.utcnow().isoformat()
+    with completed_lock:
+        if student['id'] in completed:
+            queued = CompletionWriter.DUPLICATE
+        else:
+            queued = completion_writer.submit({
+                'student_id': student['id'],
+                'exercise_id': exercise['id'],
+                'student_email': email,
+                'completed_at': completed_at,
+                'class_id': exercise['class_id']
+            })
+            if queued == CompletionWriter.QUEUED:
+                completed.add(student['id'])
+    
+    if queued == CompletionWriter.DUPLICATE:
+        logger.info("Student %s already completed exercise %s", student['id'], exercise['id'])
+        return {'error': 'You have already completed this exercise'}, 400
+    if queued == CompletionWriter.QUEUED:
+        # Not inserted yet, so there is no id to use as a stream cursor
+        completion_feed.publish(exercise['id'], {
+            'id': None,
+            'student_email': email,
+            'student_name': student['name'],
+            'completed_at': completed_at
+        })
+        logger.info("Completion queued for student %s", student['id'], extra=SAMPLED)
+        return {
+            'success': True,
+            'student_name': student['name'],
+            'exercise_name': exercise['name']
+        }, 200
+    return None
+
+def completion_response(token, exercise, email, result):
+    """Map a record_completion() result to a (body, status) response"""
+    status = result.get('status')
+    
+    if status == 'exercise_not_found':
+        # Deleted since it was cached
+        invalidate_exercise(exercise['id'])
+        logger.info("Exercise not found for token %s...", token[:8])
+        return {'error': 'Exercise not found'}, 404
+    
+    if status == 'student_not_found':
+        # Removed since the roster was cached
+        invalidate_roster(exercise['class_id'])
+        logger.info("Student not found for %s in class %s", mask_email(email), result['class_id'])
+        return {'error': 'Email not found in this class'}, 404
+    
+    if status == 'already_completed':
+        logger.info("Student %s already completed exercise %s", result['student_id'], exercise['id'])
+        return {'error': 'You have already completed this exercise'}, 400
+    
+    if status == 'recorded':
+        data_versions.bump(exercise['class_id'])
+        completion_feed.publish(exercise['id'], {
+            'id': result['completion_id'],
+            'student_email': email,
+            'student_name': result['student_name'],
+            'completed_at': result['completed_at']
+        })
+        logger.info("Completion recorded for student %s", result['student_id'], extra=SAMPLED)
+        return {
+            'success': True,
+            'student_name': result['student_name'],
+            'exercise_name': result['exercise_name']
+        }, 200
+    
+    logger.error("Failed to record completion: %s", result)
+    return {'error': 'Failed to record completion'}, 400
 
 # Routes
 @app.route('/')
@@ -65,12 +657,16 @@ def api_login():
     username = data.get('username')
     password = data.get('password')
     
+    retry_after = login_limiter.take(f'ip:{request.remote_addr}') or failed_login_limiter.wait(f'user:{username}')
+    if retry_after:
+        logger.warning("Login throttled for user %s from %s", username, request.remote_addr)
+        return retry_later('Too many login attempts. Please try again later.', 429, retry_after)
+    
     try:
-        # Check admin credentials from Supabase
-        response = supabase.table('admin').select('*').eq('username', username).execute()
+        # Check admin credentials
+        admin = get_admin(username)
         
-        if response.data and len(response.data) > 0:
-            admin = response.data[0]
+        if admin:
             # Use bcrypt to verify password
             password_hash = admin['password_hash']
             if isinstance(password_hash, str):
@@ -78,17 +674,21 @@ def api_login():
             if isinstance(password, str):
                 password = password.encode('utf-8')
             
-            if bcrypt.checkpw(password, password_hash):
+            verified = check_password(password, password_hash)
+            if verified is None:
+                logger.warning("Login rejected for user %s: password checks saturated", username)
+                return retry_later('Server busy. Please try again shortly.', 503, 1)
+            
+            if verified:
                 session['admin_id'] = admin['id']
-                print(f"✅ Admin login successful: {username}")
+                logger.info("Admin login successful: %s", username)
                 return jsonify({'success': True})
         
-        print(f"❌ Login failed for user: {username}")
+        failed_login_limiter.take(f'user:{username}')
+        logger.warning("Login failed for user: %s", username)
         return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
     except Exception as e:
-        print(f"❌ Login error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Login error: %s", e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/api/logout', methods=['POST'])
@@ -96,6 +696,39 @@ def api_logout():
     session.pop('admin_id', None)
     return jsonify({'success': True})
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    return jsonify({
+        'qr_codes': qr_cache.stats(),
+        'exercises': exercise_cache.stats(),
+        'rosters': roster_cache.stats(),
+        'data_versions': data_versions.stats(),
+        'completion_streams': completion_feed.stats(),
+        'admins': admin_cache.stats(),
+        'login_limiter': login_limiter.stats(),
+        'failed_login_limiter': failed_login_limiter.stats(),
+        'completion_queue': completion_writer.stats() if completion_writer else None
+    }), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not request_metrics:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    lines = [request_metrics.render()]
+    lines.append('# HELP cache_events_total Cache hits, misses and evictions by cache')
+    lines.append('# TYPE cache_events_total counter')
+    for cache_name, cache in (('qr_codes', qr_cache), ('exercises', exercise_cache), ('rosters', roster_cache)):
+        stats = cache.stats()
+        for event in ('hits', 'misses', 'evictions'):
+            lines.append(f'cache_events_total{{cache="{cache_name}",event="{event}"}} {stats[event]}')
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/classes', methods=['GET', 'POST'])
 def api_classes():
     if 'admin_id' not in session:
@@ -104,17 +737,13 @@ def api_classes():
     if request.method == 'POST':
         try:
             data = request.get_json()
-            print(f"Creating class: {data['name']} - {data['code']}")
+            logger.debug("Creating class: %s - %s", data['name'], data['code'])
             
-            response = supabase.table('class').insert({
-                'name': data['name'],
-                'code': data['code'],
-                'created_at': datetime.utcnow().isoformat()
-            }).execute()
+            class_data = repo.classes.create(data['name'], data['code'], datetime.utcnow().isoformat())
             
-            if response.data and len(response.data) > 0:
-                class_data = response.data[0]
-                print(f"✅ Class created with ID: {class_data['id']}")
+            if class_data:
+                data_versions.bump(CLASS_LIST)
+                logger.info("Class created with ID: %s", class_data['id'])
                 return jsonify({
                     'id': class_data['id'],
                     'name': class_data['name'],
@@ -122,34 +751,25 @@ def api_classes():
                     'student_count': 0
                 }), 200
             else:
-                print(f"❌ No data returned from insert")
+                logger.error("No data returned from class insert")
                 return jsonify({'error': 'Failed to create class'}), 400
         except Exception as e:
-            print(f"❌ Error creating class: {e}")
+            logger.exception("Error creating class: %s", e)
             return jsonify({'error': str(e)}), 400
     
     try:
-        # GET - retrieve all classes
-        response = supabase.table('class').select('*').execute()
-        classes_list = []
-        
-        if response.data:
-            for c in response.data:
-                # Count students
-                students_response = supabase.table('student').select('*', count='exact').eq('class_id', c['id']).execute()
-                student_count = len(students_response.data) if students_response.data else 0
-                
-                classes_list.append({
-                    'id': c['id'],
-                    'name': c['name'],
-                    'code': c['code'],
-                    'student_count': student_count
-                })
+        # GET - retrieve all classes with student counts in a single query
+        etag = data_etag(CLASS_LIST)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        classes_list = repo.classes.list_with_student_counts()
         
-        print(f"✅ Retrieved {len(classes_list)} classes")
-        return jsonify(classes_list), 200
+        logger.debug("Retrieved %d classes", len(classes_list))
+        return with_etag(jsonify(classes_list), etag), 200
     except Exception as e:
-        print(f"❌ Error retrieving classes: {e}")
+        logger.exception("Error retrieving classes: %s", e)
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/classes/<int:class_id>', methods=['GET', 'PUT', 'DELETE'])
@@ -159,31 +779,26 @@ def class_detail(class_id):
     
     try:
         if request.method == 'GET':
-            response = supabase.table('class').select('*').eq('id', class_id).execute()
-            if response.data and len(response.data) > 0:
-                c = response.data[0]
-                students_response = supabase.table('student').select('*').eq('class_id', class_id).execute()
-                student_count = len(students_response.data) if students_response.data else 0
-                return jsonify({
-                    'id': c['id'],
-                    'name': c['name'],
-                    'code': c['code'],
-                    'student_count': student_count
-                }), 200
+            etag = data_etag(class_id)
+            cached = not_modified(etag)
+            if cached:
+                return cached
+            
+            c = repo.classes.get_with_student_count(class_id)
+            if c:
+                return with_etag(jsonify(c), etag), 200
             return jsonify({'error': 'Class not found'}), 404
         
         elif request.method == 'PUT':
             data = request.get_json()
-            print(f"Updating class {class_id}: {data['name']} - {data['code']}")
+            logger.debug("Updating class %s: %s - %s", class_id, data['name'], data['code'])
             
-            response = supabase.table('class').update({
-                'name': data.get('name'),
-                'code': data.get('code')
-            }).eq('id', class_id).execute()
+            c = repo.classes.update(class_id, data.get('name'), data.get('code'))
             
-            if response.data:
-                c = response.data[0]
-                print(f"✅ Class updated: {class_id}")
+            if c:
+                invalidate_class_exercises(class_id)
+                data_versions.bump(CLASS_LIST, class_id)
+                logger.info("Class updated: %s", class_id)
                 return jsonify({
                     'id': c['id'],
                     'name': c['name'],
@@ -192,15 +807,17 @@ def class_detail(class_id):
             return jsonify({'error': 'Failed to update class'}), 400
         
         elif request.method == 'DELETE':
-            print(f"Deleting class {class_id}")
-            supabase.table('student').delete().eq('class_id', class_id).execute()
-            supabase.table('exercise').delete().eq('class_id', class_id).execute()
-            supabase.table('class').delete().eq('id', class_id).execute()
-            print(f"✅ Class deleted: {class_id}")
+            logger.debug("Deleting class %s", class_id)
+            for exercise_id in repo.classes.delete(class_id):
+                evict_qr_codes(exercise_id)
+            invalidate_class_exercises(class_id)
+            invalidate_roster(class_id)
+            data_versions.bump(CLASS_LIST, class_id)
+            logger.info("Class deleted: %s", class_id)
             return jsonify({'success': True}), 200
     
     except Exception as e:
-        print(f"❌ Error in class_detail: {e}")
+        logger.exception("Error in class_detail: %s", e)
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/classes/<int:class_id>/students', methods=['GET', 'POST'])
@@ -211,17 +828,14 @@ def api_students(class_id):
     try:
         if request.method == 'POST':
             data = request.get_json()
-            print(f"Creating student: {data['name']} ({data['email']}) for class {class_id}")
+            logger.debug("Creating student for class %s", class_id)
             
-            response = supabase.table('student').insert({
-                'email': data['email'],
-                'name': data['name'],
-                'class_id': class_id
-            }).execute()
+            s = repo.students.create(class_id, data['name'], data['email'])
             
-            if response.data and len(response.data) > 0:
-                s = response.data[0]
-                print(f"✅ Student created with ID: {s['id']}")
+            if s:
+                invalidate_roster(class_id)
+                data_versions.bump(CLASS_LIST, class_id)
+                logger.info("Student created with ID: %s", s['id'])
                 return jsonify({
                     'id': s['id'],
                     'email': s['email'],
@@ -229,14 +843,64 @@ def api_students(class_id):
                 }), 200
             return jsonify({'error': 'Failed to create student'}), 400
         
-        # GET - retrieve all students in class
-        response = supabase.table('student').select('*').eq('class_id', class_id).execute()
-        students_list = response.data if response.data else []
-        print(f"✅ Retrieved {len(students_list)} students for class {class_id}")
-        return jsonify(students_list), 200
+        # GET - one page of the class's students
+        etag = data_etag(class_id)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        after, limit = page_params()
+        students_list = repo.students.list_for_class(class_id, after=after, limit=limit + 1)
+        logger.debug("Retrieved %d students for class %s", len(students_list), class_id)
+        return with_etag(jsonify(page_of(students_list, limit)), etag), 200
+    
+    except Exception as e:
+        logger.exception("Error in api_students: %s", e)
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/classes/<int:class_id>/students/bulk', methods=['POST'])
+def api_students_bulk(class_id):
+    """Import many students at once from a CSV upload or a JSON array"""
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        if request.is_json:
+            items = request.get_json()
+            if not isinstance(items, list):
+                return jsonify({'error': 'Expected a JSON array of students'}), 400
+            rows, errors = rows_from_json(items)
+        else:
+            upload = request.files.get('file')
+            text = upload.read().decode('utf-8-sig') if upload else request.get_data(as_text=True)
+            rows, errors = parse_student_csv(text)
+        
+        # Validate against a fresh copy of the roster
+        invalidate_roster(class_id)
+        students, rejected = validate_student_rows(rows, get_class_roster(class_id).keys())
+        errors.extend(rejected)
+        logger.debug("Importing %d students for class %s (%d rejected)", len(students), class_id, len(errors))
+        
+        created = []
+        for start in range(0, len(students), BULK_INSERT_CHUNK_SIZE):
+            chunk = students[start:start + BULK_INSERT_CHUNK_SIZE]
+            try:
+                created.extend(
+                    {'id': s['id'], 'email': s['email'], 'name': s['name']}
+                    for s in repo.students.create_many(class_id, chunk)
+                )
+            except Exception as e:
+                errors.extend({'line': s['line'], 'email': s['email'], 'error': str(e)} for s in chunk)
+        
+        invalidate_roster(class_id)
+        if created:
+            data_versions.bump(CLASS_LIST, class_id)
+        errors.sort(key=lambda error: error['line'])
+        logger.info("Imported %d students for class %s", len(created), class_id)
+        return jsonify({'created': created, 'errors': errors}), 200
     
     except Exception as e:
-        print(f"❌ Error in api_students: {e}")
+        logger.exception("Error in api_students_bulk: %s", e)
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/students/<int:student_id>', methods=['DELETE'])
@@ -245,12 +909,15 @@ def delete_student(student_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        print(f"Deleting student {student_id}")
-        supabase.table('student').delete().eq('id', student_id).execute()
-        print(f"✅ Student deleted: {student_id}")
+        logger.debug("Deleting student %s", student_id)
+        s = repo.students.delete(student_id)
+        if s:
+            invalidate_roster(s['class_id'])
+            data_versions.bump(CLASS_LIST, s['class_id'])
+        logger.info("Student deleted: %s", student_id)
         return jsonify({'success': True}), 200
     except Exception as e:
-        print(f"❌ Error deleting student: {e}")
+        logger.exception("Error deleting student: %s", e)
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/classes/<int:class_id>/exercises', methods=['GET', 'POST'])
@@ -262,62 +929,38 @@ def api_exercises(class_id):
         if request.method == 'POST':
             data = request.get_json()
             qr_token = secrets.token_urlsafe(32)
-            print(f"Creating exercise: {data['name']} for class {class_id}")
+            logger.debug("Creating exercise: %s for class %s", data['name'], class_id)
             
-            response = supabase.table('exercise').insert({
-                'name': data['name'],
-                'class_id': class_id,
-                'qr_token': qr_token,
-                'created_at': datetime.utcnow().isoformat()
-            }).execute()
+            e = repo.exercises.create(class_id, data['name'], qr_token, datetime.utcnow().isoformat())
             
-            if response.data and len(response.data) > 0:
-                e = response.data[0]
-                print(f"✅ Exercise created with ID: {e['id']}")
-                
-                # Generate QR code
-                qr_url = request.host_url + f'complete/{qr_token}'
-                qr = qrcode.QRCode(version=1, box_size=10, border=5)
-                qr.add_data(qr_url)
-                qr.make(fit=True)
-                img = qr.make_image(fill_color="black", back_color="white")
-                
-                buf = io.BytesIO()
-                img.save(buf, format='PNG')
-                buf.seek(0)
-                qr_base64 = base64.b64encode(buf.getvalue()).decode()
+            if e:
+                data_versions.bump(class_id)
+                logger.info("Exercise created with ID: %s", e['id'])
                 
                 return jsonify({
                     'id': e['id'],
                     'name': e['name'],
-                    'qr_code': qr_base64,
-                    'qr_url': qr_url,
+                    'qr_image_url': url_for('exercise_qr_png', exercise_id=e['id']),
+                    'qr_url': completion_url(qr_token),
                     'created_at': e['created_at'],
                     'completion_count': 0
                 }), 200
             return jsonify({'error': 'Failed to create exercise'}), 400
         
-        # GET - retrieve all exercises for class
-        response = supabase.table('exercise').select('*').eq('class_id', class_id).execute()
-        result = []
+        # GET - one page of the class's exercises with completion counts in a single query
+        etag = data_etag(class_id)
+        cached = not_modified(etag)
+        if cached:
+            return cached
         
-        if response.data:
-            for e in response.data:
-                completions_response = supabase.table('completion').select('*').eq('exercise_id', e['id']).execute()
-                completion_count = len(completions_response.data) if completions_response.data else 0
-                
-                result.append({
-                    'id': e['id'],
-                    'name': e['name'],
-                    'created_at': e['created_at'],
-                    'completion_count': completion_count
-                })
+        after, limit = page_params()
+        result = repo.exercises.list_with_completion_counts(class_id, after=after, limit=limit + 1)
         
-        print(f"✅ Retrieved {len(result)} exercises for class {class_id}")
-        return jsonify(result), 200
+        logger.debug("Retrieved %d exercises for class %s", len(result), class_id)
+        return with_etag(jsonify(page_of(result, limit)), etag), 200
     
     except Exception as e:
-        print(f"❌ Error in api_exercises: {e}")
+        logger.exception("Error in api_exercises: %s", e)
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/exercises/<int:exercise_id>', methods=['GET', 'DELETE'])
@@ -327,44 +970,64 @@ def exercise_detail(exercise_id):
     
     try:
         if request.method == 'GET':
-            # Get exercise details and regenerate QR code
-            print(f"Getting QR code for exercise {exercise_id}")
-            response = supabase.table('exercise').select('*').eq('id', exercise_id).execute()
+            # Get exercise details; the QR image itself is served by exercise_qr_png
+            logger.debug("Getting QR code for exercise %s", exercise_id)
+            exercise = repo.exercises.get(exercise_id)
             
-            if not response.data:
+            if not exercise:
                 return jsonify({'error': 'Exercise not found'}), 404
             
-            exercise = response.data[0]
-            
-            # Generate QR code
-            qr_url = request.host_url + f'complete/{exercise["qr_token"]}'
-            qr = qrcode.QRCode(version=1, box_size=10, border=5)
-            qr.add_data(qr_url)
-            qr.make(fit=True)
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            buf = io.BytesIO()
-            img.save(buf, format='PNG')
-            buf.seek(0)
-            qr_base64 = base64.b64encode(buf.getvalue()).decode()
-            
-            print(f"✅ QR code generated for exercise {exercise_id}")
             return jsonify({
                 'id': exercise['id'],
                 'name': exercise['name'],
-                'qr_code': qr_base64,
-                'qr_url': qr_url,
+                'qr_image_url': url_for('exercise_qr_png', exercise_id=exercise['id']),
+                'qr_url': completion_url(exercise['qr_token']),
                 'created_at': exercise['created_at']
             }), 200
         
         elif request.method == 'DELETE':
-            print(f"Deleting exercise {exercise_id}")
-            supabase.table('completion').delete().eq('exercise_id', exercise_id).execute()
-            supabase.table('exercise').delete().eq('id', exercise_id).execute()
-            print(f"✅ Exercise deleted: {exercise_id}")
+            logger.debug("Deleting exercise %s", exercise_id)
+            e = repo.exercises.delete(exercise_id)
+            evict_qr_codes(exercise_id)
+            invalidate_exercise(exercise_id)
+            if e:
+                data_versions.bump(e['class_id'])
+            logger.info("Exercise deleted: %s", exercise_id)
             return jsonify({'success': True}), 200
     except Exception as e:
-        print(f"❌ Error in exercise_detail: {e}")
+        logger.exception("Error in exercise_detail: %s", e)
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/exercises/<int:exercise_id>/qr.png', methods=['GET'])
+def exercise_qr_png(exercise_id):
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        exercise = repo.exercises.get(exercise_id)
+        if not exercise:
+            return jsonify({'error': 'Exercise not found'}), 404
+        
+        qr_url = completion_url(exercise['qr_token'])
+        
+        # The image is fully determined by the URL and render settings, so the
+        # ETag can be checked before anything is rendered
+        etag = qr_etag(qr_url)
+        if etag in request.if_none_match:
+            png = b''
+            status = 304
+        else:
+            png = get_qr_png(exercise_id, qr_url)
+            status = 200
+        
+        qr_response = Response(png, status=status, mimetype='image/png')
+        qr_response.set_etag(etag)
+        qr_response.cache_control.private = True
+        qr_response.cache_control.max_age = QR_CACHE_MAX_AGE
+        qr_response.cache_control.immutable = True
+        return qr_response
+    except Exception as e:
+        logger.exception("Error rendering QR code: %s", e)
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/exercises/<int:exercise_id>/completions', methods=['GET'])
@@ -373,63 +1036,52 @@ def get_completions(exercise_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        response = supabase.table('completion').select('*').eq('exercise_id', exercise_id).execute()
-        result = []
-        
-        if response.data:
-            for c in response.data:
-                student_response = supabase.table('student').select('*').eq('id', c['student_id']).execute()
-                student_name = student_response.data[0]['name'] if student_response.data else 'Unknown'
-                
-                result.append({
-                    'id': c['id'],
-                    'student_email': c['student_email'],
-                    'student_name': student_name,
-                    'completed_at': c['completed_at']
-                })
+        after, limit = page_params()
+        result = repo.completions.list_for_exercise(exercise_id, after=after, limit=limit + 1)
         
-        print(f"✅ Retrieved {len(result)} completions for exercise {exercise_id}")
-        return jsonify(result), 200
+        logger.debug("Retrieved %d completions for exercise %s", len(result), exercise_id)
+        return jsonify(page_of(result, limit)), 200
     except Exception as e:
-        print(f"❌ Error getting completions: {e}")
+        logger.exception("Error getting completions: %s", e)
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/exercises/<int:exercise_id>/completions/stream', methods=['GET'])
+def stream_completions(exercise_id):
+    """The live completions stream is served by asgi.py, where an open stream
+    costs a coroutine instead of a worker. Reaching the WSGI app means it
+    isn't deployed (e.g. on Vercel), so answer at once and let the dashboard
+    poll get_completions instead."""
+    return jsonify({'error': 'Live completions are not available; poll /completions instead'}), 404
+
 @app.route('/api/exercises/<int:exercise_id>/export', methods=['GET'])
 def export_exercise(exercise_id):
     if 'admin_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        print(f"Exporting exercise {exercise_id}")
+        logger.debug("Exporting exercise %s", exercise_id)
         
-        exercise_response = supabase.table('exercise').select('*').eq('id', exercise_id).execute()
-        if not exercise_response.data:
+        exercise = repo.exercises.get(exercise_id)
+        if not exercise:
             return jsonify({'error': 'Exercise not found'}), 404
         
-        exercise = exercise_response.data[0]
-        completions_response = supabase.table('completion').select('*').eq('exercise_id', exercise_id).execute()
-        
         # Create CSV
         output = StringIO()
         writer = csv.writer(output)
         writer.writerow(['Student Name', 'Email', 'Completed At'])
         
-        if completions_response.data:
-            for c in completions_response.data:
-                student_response = supabase.table('student').select('*').eq('id', c['student_id']).execute()
-                student_name = student_response.data[0]['name'] if student_response.data else 'Unknown'
-                
-                writer.writerow([
-                    student_name,
-                    c['student_email'],
-                    c['completed_at']
-                ])
+        for c in repo.completions.list_for_exercise(exercise_id):
+            writer.writerow([
+                c['student_name'],
+                c['student_email'],
+                c['completed_at']
+            ])
         
         csv_bytes = io.BytesIO()
         csv_bytes.write(output.getvalue().encode('utf-8'))
         csv_bytes.seek(0)
         
-        print(f"✅ Exported exercise {exercise_id}")
+        logger.info("Exported exercise %s", exercise_id)
         return send_file(
             csv_bytes,
             mimetype='text/csv',
@@ -437,7 +1089,36 @@ def export_exercise(exercise_id):
             download_name=f"{exercise['name']}_completions.csv"
         )
     except Exception as e:
-        print(f"❌ Error exporting exercise: {e}")
+        logger.exception("Error exporting exercise: %s", e)
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/classes/<int:class_id>/stats', methods=['GET'])
+def class_stats(class_id):
+    """Completion counts and rates per student, per exercise and for the class,
+    read from the summary the database maintains on every write"""
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        etag = data_etag(class_id)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        stats = repo.classes.stats(class_id)
+        if not stats:
+            return jsonify({'error': 'Class not found'}), 404
+        
+        student_count, exercise_count = stats['student_count'], stats['exercise_count']
+        stats['completion_rate'] = completion_rate(stats['completion_count'], student_count * exercise_count)
+        for student in stats['students']:
+            student['completion_rate'] = completion_rate(student['completion_count'], exercise_count)
+        for exercise in stats['exercises']:
+            exercise['completion_rate'] = completion_rate(exercise['completion_count'], student_count)
+        
+        return with_etag(jsonify(stats), etag), 200
+    except Exception as e:
+        logger.exception("Error in class_stats: %s", e)
         return jsonify({'error': str(e)}), 400
 
 @app.route('/api/classes/<int:class_id>/export', methods=['GET'])
@@ -447,123 +1128,113 @@ def export_class_comprehensive(class_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        print(f"Exporting comprehensive CSV for class {class_id}")
+        logger.debug("Exporting comprehensive CSV for class %s", class_id)
         
         # Get class info
-        class_response = supabase.table('class').select('*').eq('id', class_id).execute()
-        if not class_response.data:
+        class_info = repo.classes.get(class_id)
+        if not class_info:
             return jsonify({'error': 'Class not found'}), 404
         
-        class_info = class_response.data[0]
-        
-        # Get all students in class
-        students_response = supabase.table('student').select('*').eq('class_id', class_id).execute()
-        students = {s['id']: s for s in students_response.data} if students_response.data else {}
-        
         # Get all exercises for class
-        exercises_response = supabase.table('exercise').select('*').eq('class_id', class_id).execute()
-        exercises = exercises_response.data if exercises_response.data else []
+        exercises = repo.exercises.list_for_class(class_id)
         
         if not exercises:
             return jsonify({'error': 'No exercises found for this class'}), 404
         
-        # Build comprehensive data structure
-        # Key: student_id, Value: dict with student info and completion dates
-        student_data = {}
+        # Get all students in class, in the same order as their completions
+        students = repo.students.roster(class_id)
         
-        for student_id, student in students.items():
-            student_data[student_id] = {
-                'name': student['name'],
-                'email': student['email'],
-                'completions': {}
-            }
+        return Response(
+            stream_with_context(generate_class_csv(class_id, students, exercises)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename="{class_info["name"]}_all_exercises.csv"'}
+        )
+    except Exception as e:
+        logger.exception("Error exporting class: %s", e)
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/classes/<int:class_id>/qr-sheet', methods=['GET'])
+def class_qr_sheet(class_id):
+    """Printable QR codes for every exercise in a class (?format=pdf or png)"""
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        sheet_format = request.args.get('format', 'pdf').lower()
+        if sheet_format not in QR_SHEET_FORMATS:
+            return jsonify({'error': 'format must be pdf or png'}), 400
         
-        # Get completions for each exercise
-        for exercise in exercises:
-            completions_response = supabase.table('completion').select('*').eq('exercise_id', exercise['id']).execute()
-            
-            if completions_response.data:
-                for completion in completions_response.data:
-                    student_id = completion.get('student_id')
-                    if student_id and student_id in student_data:
-                        student_data[student_id]['completions'][exercise['name']] = completion['completed_at']
+        class_info = repo.classes.get(class_id)
+        if not class_info:
+            return jsonify({'error': 'Class not found'}), 404
         
-        # Create CSV with dynamic columns
-        output = StringIO()
-        writer = csv.writer(output)
+        exercises = repo.exercises.list_for_class(class_id)
+        if not exercises:
+            return jsonify({'error': 'No exercises found for this class'}), 404
         
-        # Header row: Student Name, Email, then each exercise name
-        exercise_names = [ex['name'] for ex in exercises]
-        header = ['Student Name', 'Email'] + exercise_names + ['Total Completed', 'Completion Rate']
-        writer.writerow(header)
+        logger.debug("Rendering QR sheet for class %s (%d exercises)", class_id, len(exercises))
         
-        # Data rows
-        for student_id, data in student_data.items():
-            row = [data['name'], data['email']]
-            
-            completed_count = 0
-            for exercise_name in exercise_names:
-                completion_date = data['completions'].get(exercise_name, '')
-                if completion_date:
-                    # Format date nicely
-                    try:
-                        from datetime import datetime
-                        dt = datetime.fromisoformat(completion_date.replace('Z', '+00:00'))
-                        formatted_date = dt.strftime('%Y-%m-%d %H:%M')
-                        row.append(formatted_date)
-                        completed_count += 1
-                    except:
-                        row.append(completion_date)
-                        completed_count += 1
-                else:
-                    row.append('')
-            
-            # Add totals
-            total_exercises = len(exercise_names)
-            completion_rate = f"{(completed_count / total_exercises * 100):.1f}%" if total_exercises > 0 else "0%"
-            row.append(f"{completed_count}/{total_exercises}")
-            row.append(completion_rate)
-            
-            writer.writerow(row)
+        with timed_segment('qr'):
+            pngs = render_qr_pngs([(e['id'], completion_url(e['qr_token'])) for e in exercises])
+            title = f"{class_info['name']} ({class_info['code']})"
+            codes = [(e['name'], png) for e, png in zip(exercises, pngs)]
+            if sheet_format == 'pdf':
+                sheet = qr_sheet.sheet_pdf(codes, title)
+            else:
+                sheet = qr_sheet.sheet_png(codes, title)
         
-        # Add summary row
-        writer.writerow([])
-        writer.writerow(['Summary Statistics'])
-        writer.writerow(['Total Students', len(student_data)])
-        writer.writerow(['Total Exercises', len(exercises)])
+        safe_name = re.sub(r'[^A-Za-z0-9._-]+', '_', class_info['name']).strip('_') or 'class'
+        return Response(
+            sheet,
+            mimetype=QR_SHEET_FORMATS[sheet_format],
+            headers={'Content-Disposition': f'attachment; filename="{safe_name}_qr_codes.{sheet_format}"'}
+        )
+    except Exception as e:
+        logger.exception("Error rendering QR sheet: %s", e)
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/export/semester', methods=['GET'])
+def export_semester():
+    """Export several classes (?class_ids=1,2,3, or all by default) as one ZIP"""
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        requested = request.args.get('class_ids', 'all').strip()
+        if requested == 'all':
+            class_ids = [c['id'] for c in repo.classes.list_with_student_counts()]
+        else:
+            try:
+                class_ids = list(dict.fromkeys(int(class_id) for class_id in requested.split(',') if class_id.strip()))
+            except ValueError:
+                return jsonify({'error': 'class_ids must be "all" or a comma-separated list of ids'}), 400
         
-        csv_bytes = io.BytesIO()
-        csv_bytes.write(output.getvalue().encode('utf-8'))
-        csv_bytes.seek(0)
+        if not class_ids:
+            return jsonify({'error': 'No classes to export'}), 404
         
-        print(f"✅ Exported comprehensive CSV for class {class_id}")
-        return send_file(
-            csv_bytes,
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f"{class_info['name']}_all_exercises.csv"
+        logger.debug("Exporting semester archive for %d classes", len(class_ids))
+        
+        filename = f"semester_export_{datetime.utcnow().strftime('%Y-%m-%d')}.zip"
+        return Response(
+            stream_with_context(generate_semester_zip(class_ids)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
         )
     except Exception as e:
-        print(f"❌ Error exporting class: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error exporting semester: %s", e)
         return jsonify({'error': str(e)}), 400
 
 @app.route('/complete/<token>')
 def complete_page(token):
     try:
-        response = supabase.table('exercise').select('*').eq('qr_token', token).execute()
+        exercise, class_info = get_exercise_by_token(token)
         
-        if not response.data:
+        if not exercise:
             return "Exercise not found", 404
         
-        exercise = response.data[0]
-        class_response = supabase.table('class').select('*').eq('id', exercise['class_id']).execute()
-        class_info = class_response.data[0] if class_response.data else None
-        
         return render_template('complete.html', exercise=exercise, class_info=class_info)
     except Exception as e:
-        print(f"❌ Error in complete_page: {e}")
+        logger.exception("Error in complete_page: %s", e)
         return f"Error: {str(e)}", 500
 
 @app.route('/api/complete/<token>', methods=['POST'])
@@ -572,58 +1243,41 @@ def api_complete(token):
         data = request.get_json()
         email = data.get('email', '').strip().lower()
         
-        print(f"Processing completion for email: {email}, token: {token[:20]}...")
+        logger.debug("Processing completion for %s, token %s...", mask_email(email), token[:8])
         
-        # Find exercise with this token
-        exercise_response = supabase.table('exercise').select('*').eq('qr_token', token).execute()
-        if not exercise_response.data:
-            print(f"❌ Exercise not found for token: {token}")
+        # Unknown tokens are rejected from the shared exercise cache
+        exercise, _ = get_exercise_by_token(token)
+        if not exercise:
+            logger.info("Exercise not found for token %s...", token[:8])
             return jsonify({'error': 'Exercise not found'}), 404
         
-        exercise = exercise_response.data[0]
-        print(f"✅ Found exercise: {exercise['name']}")
-        
-        # Find student with this email in this class
-        student_response = supabase.table('student').select('*').eq('class_id', exercise['class_id']).eq('email', email).execute()
-        if not student_response.data:
-            print(f"❌ Student not found for email: {email} in class {exercise['class_id']}")
+        # Validate the email against the cached class roster
+        student = find_student(exercise['class_id'], email)
+        if not student:
+            logger.info("Student not found for %s in class %s", mask_email(email), exercise['class_id'])
             return jsonify({'error': 'Email not found in this class'}), 404
         
-        student = student_response.data[0]
-        print(f"✅ Found student: {student['name']}")
+        if completion_writer:
+            queued = queue_completion(exercise, student, email, get_completed_students(exercise['id']))
+            if queued:
+                body, status = queued
+                return jsonify(body), status
         
-        # Check if already completed
-        existing_response = supabase.table('completion').select('*').eq('student_id', student['id']).eq('exercise_id', exercise['id']).execute()
-        if existing_response.data:
-            print(f"❌ Student already completed this exercise")
-            return jsonify({'error': 'You have already completed this exercise'}), 400
-        
-        # Add completion
-        completion_response = supabase.table('completion').insert({
-            'student_id': student['id'],
-            'exercise_id': exercise['id'],
-            'student_email': email,
-            'completed_at': datetime.utcnow().isoformat()
-        }).execute()
-        
-        if completion_response.data:
-            print(f"✅ Completion recorded for student {student['id']}")
-            return jsonify({
-                'success': True,
-                'student_name': student['name'],
-                'exercise_name': exercise['name']
-            }), 200
-        else:
-            print(f"❌ Failed to record completion")
-            return jsonify({'error': 'Failed to record completion'}), 400
+        # Record the completion in one round trip; the database stays
+        # authoritative (see migrations/001_record_completion.sql)
+        body, status = completion_response(token, exercise, email, repo.completions.record(token, email))
+        return jsonify(body), status
     
     except Exception as e:
-        print(f"❌ Error in api_complete: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in api_complete: %s", e)
         return jsonify({'error': str(e)}), 400
 
 if __name__ == '__main__':
+    if '--profile-startup' in sys.argv:
+        from benchmarks.startup import main as profile_startup
+        profile_startup([])
+        sys.exit(0)
+    
     if not os.path.exists('templates'):
         os.makedirs('templates')
     
@@ -631,7 +1285,7 @@ if __name__ == '__main__':
         print("\n" + "="*50)
         print("🚀 ClassTracker - Supabase Edition")
         print("="*50)
-        print(f"Supabase URL: {SUPABASE_URL}")
+        print(f"Data backend: {DATA_BACKEND}")
         print("="*50 + "\n")
     
     app.run(debug=os.getenv('FLASK_ENV') != 'production', host='127.0.0.1', port=5001)
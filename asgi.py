@@ -0,0 +1,309 @@
+"""
+ASGI entry point for the student completion routes.
+
+    uvicorn asgi:app --workers 2
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+
+Serves `GET /complete/<token>` and `POST /api/complete/<token>` from an
+event loop, with backend calls made through repositories/aio.py, so
+hundreds of scans can be waiting on the database in one process. All other
+routes (admin pages and API) stay on the WSGI `app` in wsgi.py; send
+`/complete/*`, `/api/complete/*` and `/api/exercises/*/completions/stream`
+here at the proxy.
+
+The completions stream is served here because this is the process that
+accepts the completions it publishes, and an open stream only costs a
+coroutine instead of a WSGI worker. It authenticates with the admin
+session cookie, so SECRET_KEY must be the same for both apps. Completions
+accepted by another process reach a stream through the snapshot sent
+when the browser reconnects (every COMPLETION_STREAM_MAX_AGE seconds).
+
+Token/roster caches, the write-behind queue, the completion feed and the
+response mapping are shared with app.py.
+"""
+
+import asyncio
+import json
+import re
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from itsdangerous import BadSignature
+
+from app import (
+    COMPLETION_STREAM_KEEPALIVE, COMPLETION_STREAM_MAX_AGE, DATA_BACKEND,
+    app as flask_app, completed_cache, completion_feed, completion_response,
+    completion_stream_event, completion_writer, exercise_cache, logger,
+    mask_email, queue_completion, roster_cache, roster_index, roster_reloads,
+    sse_event
+)
+from repositories import LazyRepository
+from repositories.aio import create_async_repository
+
+COMPLETE_PAGE = re.compile(r'/complete/([^/]+)')
+COMPLETE_API = re.compile(r'/api/complete/([^/]+)')
+COMPLETIONS_STREAM = re.compile(r'/api/exercises/(\d+)/completions/stream')
+
+# Completion requests only carry an email address
+MAX_BODY_SIZE = 16 * 1024
+
+repo = LazyRepository(lambda: create_async_repository(DATA_BACKEND))
+
+# Backend loads in progress, shared by concurrent requests for the same key
+inflight = {}
+
+async def load_once(key, load):
+    """Await load(), joining an identical load that is already running"""
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(load())
+        inflight[key] = task
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+    # Shielded so one cancelled request doesn't cancel the load for the others
+    return await asyncio.shield(task)
+
+async def get_exercise_by_token(token):
+    """Async counterpart of app.get_exercise_by_token(), using the same cache"""
+    cached = exercise_cache.get(token)
+    if cached is not None:
+        return cached
+    
+    exercise, class_info = await load_once(('exercise', token), lambda: repo.exercises.get_by_token(token))
+    if not exercise:
+        return None, None
+    
+    exercise_cache.set(token, (exercise, class_info))
+    return exercise, class_info
+
+async def get_class_roster(class_id):
+    """Async counterpart of app.get_class_roster(), using the same cache"""
+    roster = roster_cache.get(class_id)
+    if roster is None:
+        roster = roster_index(await load_once(('roster', class_id), lambda: repo.students.roster(class_id)))
+        roster_cache.set(class_id, roster)
+    return roster
+
+async def find_student(class_id, email):
+    """Async counterpart of app.find_student()"""
+    roster = roster_cache.get(class_id)
+    if roster is None:
+        return (await get_class_roster(class_id)).get(email)
+    student = roster.get(email)
+    if student is None and not roster_reloads.take(class_id):
+        roster_cache.pop(class_id)
+        student = (await get_class_roster(class_id)).get(email)
+    return student
+
+async def get_completed_students(exercise_id):
+    """Async counterpart of app.get_completed_students(), using the same cache"""
+    completed = completed_cache.get(exercise_id)
+    if completed is None:
+        pending = completion_writer.pending_students(exercise_id)
+        completed = pending | set(await load_once(('completed', exercise_id), lambda: repo.completions.student_ids_for_exercise(exercise_id)))
+        completed_cache.set(exercise_id, completed)
+    return completed
+
+async def send_response(send, status, body, content_type, head=False):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type.encode()),
+            (b'content-length', str(len(body)).encode())
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': b'' if head else body})
+
+async def send_text(send, status, text, head=False):
+    await send_response(send, status, text.encode(), 'text/html; charset=utf-8', head)
+
+async def send_json(send, status, data):
+    await send_response(send, status, json.dumps(data).encode(), 'application/json')
+
+def request_header(scope, name):
+    for key, value in scope['headers']:
+        if key.decode('latin-1').lower() == name:
+            return value.decode('latin-1')
+    return None
+
+def int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def session_admin_id(scope):
+    """admin_id from the Flask session cookie sent with the request, or None"""
+    morsel = SimpleCookie(request_header(scope, 'cookie') or '').get(flask_app.config['SESSION_COOKIE_NAME'])
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if morsel is None or serializer is None:
+        return None
+    try:
+        data = serializer.loads(morsel.value, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    return data.get('admin_id')
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+async def read_body(receive):
+    """Read the request body, or return None if it exceeds MAX_BODY_SIZE"""
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if len(body) > MAX_BODY_SIZE:
+            return None
+        if not message.get('more_body'):
+            return body
+
+async def complete_page(send, token, head):
+    try:
+        exercise, class_info = await get_exercise_by_token(token)
+        
+        if not exercise:
+            return await send_text(send, 404, "Exercise not found", head)
+        
+        html = flask_app.jinja_env.get_template('complete.html').render(exercise=exercise, class_info=class_info)
+        return await send_text(send, 200, html, head)
+    except Exception as e:
+        logger.exception("Error in complete_page: %s", e)
+        return await send_text(send, 500, f"Error: {str(e)}", head)
+
+async def api_complete(receive, send, token):
+    try:
+        body = await read_body(receive)
+        if body is None:
+            return await send_json(send, 413, {'error': 'Request body too large'})
+        
+        data = json.loads(body)
+        email = data.get('email', '').strip().lower()
+        
+        logger.debug("Processing completion for %s, token %s...", mask_email(email), token[:8])
+        
+        exercise, _ = await get_exercise_by_token(token)
+        if not exercise:
+            logger.info("Exercise not found for token %s...", token[:8])
+            return await send_json(send, 404, {'error': 'Exercise not found'})
+        
+        student = await find_student(exercise['class_id'], email)
+        if not student:
+            logger.info("Student not found for %s in class %s", mask_email(email), exercise['class_id'])
+            return await send_json(send, 404, {'error': 'Email not found in this class'})
+        
+        if completion_writer:
+            queued = queue_completion(exercise, student, email, await get_completed_students(exercise['id']))
+            if queued:
+                result, status = queued
+                return await send_json(send, status, result)
+        
+        result = await repo.completions.record(token, email)
+        result, status = completion_response(token, exercise, email, result)
+        return await send_json(send, status, result)
+    
+    except Exception as e:
+        logger.exception("Error in api_complete: %s", e)
+        return await send_json(send, 400, {'error': str(e)})
+
+async def stream_completions(scope, receive, send, exercise_id):
+    """Async counterpart of app.stream_completions()"""
+    if session_admin_id(scope) is None:
+        return await send_json(send, 401, {'error': 'Unauthorized'})
+    
+    since = int_or_none(parse_qs(scope['query_string'].decode('latin-1')).get('since', [None])[0])
+    if since is None:
+        since = int_or_none(request_header(scope, 'last-event-id'))
+    
+    loop = asyncio.get_running_loop()
+    # Subscribe before reading the snapshot so nothing accepted in between is missed
+    subscription = completion_feed.subscribe(exercise_id, loop)
+    try:
+        try:
+            snapshot = await repo.completions.list_for_exercise(exercise_id, after=since)
+        except Exception as e:
+            logger.exception("Error getting completions: %s", e)
+            return await send_json(send, 400, {'error': str(e)})
+        
+        logger.debug("Streaming completions for exercise %s from %s (%d in snapshot)", exercise_id, since, len(snapshot))
+        
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no')
+            ]
+        })
+        
+        async def send_text_chunk(text):
+            await send({'type': 'http.response.body', 'body': text.encode(), 'more_body': True})
+        
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            last_id = snapshot[-1]['id'] if snapshot else since
+            await send_text_chunk('retry: 2000\n\n' + sse_event('snapshot', snapshot, last_id))
+            
+            deadline = loop.time() + COMPLETION_STREAM_MAX_AGE
+            while not subscription.dropped and not disconnected.done():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                
+                event = await subscription.get_async(timeout=min(COMPLETION_STREAM_KEEPALIVE, remaining))
+                if event is None:
+                    await send_text_chunk(': keepalive\n\n')
+                    continue
+                
+                text, last_id = completion_stream_event(event, last_id)
+                if text:
+                    await send_text_chunk(text)
+        finally:
+            disconnected.cancel()
+        
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        completion_feed.unsubscribe(subscription)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Only close a client that was actually created
+            client = getattr(repo._repo, 'client', None)
+            if client is not None and hasattr(client, 'aclose'):
+                await client.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    
+    method, path = scope['method'], scope['path']
+    
+    match = COMPLETE_PAGE.fullmatch(path)
+    if match:
+        if method not in ('GET', 'HEAD'):
+            return await send_text(send, 405, "Method Not Allowed")
+        return await complete_page(send, match.group(1), head=method == 'HEAD')
+    
+    match = COMPLETE_API.fullmatch(path)
+    if match:
+        if method != 'POST':
+            return await send_json(send, 405, {'error': 'Method not allowed'})
+        return await api_complete(receive, send, match.group(1))
+    
+    match = COMPLETIONS_STREAM.fullmatch(path)
+    if match:
+        if method != 'GET':
+            return await send_json(send, 405, {'error': 'Method not allowed'})
+        return await stream_completions(scope, receive, send, int(match.group(1)))
+    
+    return await send_text(send, 404, "Not Found")
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot endpoints against a seeded local SQLite backend.
+
+Seeds a synthetic dataset (classes x students x exercises, with a given
+share of completions), then drives the Flask app through its test client,
+first sequentially and then with a pool of concurrent clients, and prints
+throughput, latency percentiles and backend round trips per request as
+JSON.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench --classes 10 --students 200 --exercises 30 \\
+        --completion-ratio 0.7 --requests 300 --concurrency 8 --output run.json
+
+Round trips are counted where the backend makes them (see
+repositories/round_trips.py). --backend-latency-ms adds a fixed delay to
+every round trip to approximate the network round trip to Supabase.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import secrets
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ENDPOINTS = ('api_complete', 'api_classes', 'get_completions', 'export_class_comprehensive')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--classes', type=int, default=5)
+    parser.add_argument('--students', type=int, default=100, help='students per class')
+    parser.add_argument('--exercises', type=int, default=20, help='exercises per class')
+    parser.add_argument('--completion-ratio', type=float, default=0.5,
+                        help='share of (student, exercise) pairs already completed')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint and phase')
+    parser.add_argument('--concurrency', type=int, default=8, help='clients in the concurrent phase')
+    parser.add_argument('--backend-latency-ms', type=float, default=0.0)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    return parser.parse_args(argv)
+
+
+def load_app():
+    """Import the app against a fresh in-memory SQLite database"""
+    os.environ['DATA_BACKEND'] = 'sqlite'
+    os.environ['SQLITE_PATH'] = ':memory:'
+    os.environ.setdefault('FLASK_ENV', 'production')
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        import app
+    return app
+
+
+def seed(repo, args, rng):
+    """Insert the synthetic dataset and return what the workloads need"""
+    created_at = datetime.utcnow().isoformat()
+    dataset = {'classes': [], 'exercises': [], 'pending': []}
+
+    for class_index in range(args.classes):
+        c = repo.classes.create(f'Class {class_index}', f'C{class_index:03d}', created_at)
+        students = repo.students.create_many(c['id'], [
+            {'name': f'Student {class_index}-{i}', 'email': f's{class_index}-{i}@example.edu'}
+            for i in range(args.students)
+        ])
+        exercises = [
+            repo.exercises.create(c['id'], f'Exercise {i}', secrets.token_urlsafe(32), created_at)
+            for i in range(args.exercises)
+        ]
+
+        completions = []
+        for exercise in exercises:
+            for student in students:
+                if rng.random() < args.completion_ratio:
+                    completions.append({
+                        'student_id': student['id'],
+                        'exercise_id': exercise['id'],
+                        'student_email': student['email'],
+                        'completed_at': created_at
+                    })
+                else:
+                    dataset['pending'].append((exercise['qr_token'], student['email']))
+        repo.completions.insert_many(completions)
+
+        dataset['classes'].append(c['id'])
+        dataset['exercises'].extend(e['id'] for e in exercises)
+
+    rng.shuffle(dataset['pending'])
+    return dataset
+
+
+class RoundTripCounter:
+    """Counts database round trips made by the current thread"""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def __call__(self, backend, seconds):
+        self.local.count = getattr(self.local, 'count', 0) + 1
+
+    def take(self):
+        count = getattr(self.local, 'count', 0)
+        self.local.count = 0
+        return count
+
+
+def make_requests(endpoint, dataset, count, rng):
+    """Build (method, path, json) tuples for one endpoint"""
+    if endpoint == 'api_complete':
+        # New completions while they last, then repeat submissions
+        pairs = [dataset['pending'].pop() for _ in range(min(count, len(dataset['pending'])))]
+        while len(pairs) < count:
+            pairs.append(rng.choice(pairs) if pairs else ('missing', 'nobody@example.edu'))
+        return [('POST', f'/api/complete/{token}', {'email': email}) for token, email in pairs]
+    if endpoint == 'api_classes':
+        return [('GET', '/api/classes', None)] * count
+    if endpoint == 'get_completions':
+        return [('GET', f"/api/exercises/{rng.choice(dataset['exercises'])}/completions", None) for _ in range(count)]
+    if endpoint == 'export_class_comprehensive':
+        return [('GET', f"/api/classes/{rng.choice(dataset['classes'])}/export", None) for _ in range(count)]
+    raise ValueError(f'Unknown endpoint: {endpoint}')
+
+
+def admin_client(flask_app):
+    client = flask_app.test_client()
+    with client.session_transaction() as session:
+        session['admin_id'] = 1
+    return client
+
+
+def run_phase(flask_app, requests, concurrency, counter):
+    """Send requests and collect (latency seconds, round trips, status) per request"""
+    clients = threading.local()
+
+    def send(request_spec):
+        if not hasattr(clients, 'client'):
+            clients.client = admin_client(flask_app)
+        method, path, body = request_spec
+        counter.take()
+        start = time.perf_counter()
+        response = clients.client.open(path, method=method, json=body)
+        response.get_data()
+        return time.perf_counter() - start, counter.take(), response.status_code
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        samples = [send(spec) for spec in requests]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(send, requests))
+    return samples, time.perf_counter() - start
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency * 1000 for latency, _, _ in samples)
+    statuses = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(samples),
+        'elapsed_s': round(elapsed, 4),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 3) if latencies else 0.0,
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(latencies[-1], 3) if latencies else 0.0
+        },
+        'round_trips_per_request': round(statistics.fmean(trips for _, trips, _ in samples), 3) if samples else 0.0,
+        'status_codes': statuses
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    app_module = load_app()
+
+    from repositories.round_trips import round_trips
+
+    seed_start = time.perf_counter()
+    dataset = seed(app_module.repo, args, rng)
+    seed_elapsed = time.perf_counter() - seed_start
+
+    counter = RoundTripCounter()
+    round_trips.add_listener(counter)
+    round_trips.latency = args.backend_latency_ms / 1000
+
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'seed_s': round(seed_elapsed, 4),
+        'python': sys.version.split()[0],
+        'results': {}
+    }
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        for endpoint in args.endpoints.split(','):
+            report['results'][endpoint] = {}
+            for phase, concurrency in (('sequential', 1), ('concurrent', args.concurrency)):
+                requests = make_requests(endpoint, dataset, args.requests, rng)
+                samples, elapsed = run_phase(app_module.app, requests, concurrency, counter)
+                report['results'][endpoint][phase] = summarize(samples, elapsed)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Measure cold-start cost of importing the app.
+
+Imports `app` in fresh interpreters (as a serverless cold start would) and
+reports, as JSON: wall time of the import, which heavy dependencies were
+loaded by it, the slowest modules from `python -X importtime`, and the
+one-off cost of the work deferred to first use (backend client, QR
+rendering, bcrypt).
+
+Usage (from the repository root):
+
+    python -m benchmarks.startup --runs 5
+    python app.py --profile-startup
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('supabase', 'postgrest', 'httpx', 'qrcode', 'PIL', 'bcrypt')
+
+# Runs in the child interpreter and prints one JSON line
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+import_ms = (time.perf_counter() - start) * 1000
+loaded = [m for m in %(heavy)r if m in sys.modules]
+
+first_use = {}
+for name, action in (
+    ('backend', lambda: app.repo.name),
+    ('qrcode', lambda: app.render_qr_png('https://example.com/complete/token')),
+    ('bcrypt', lambda: __import__('bcrypt')),
+):
+    start = time.perf_counter()
+    try:
+        action()
+        first_use[name] = round((time.perf_counter() - start) * 1000, 2)
+    except Exception as e:
+        first_use[name] = 'error: %%s' %% e
+print(json.dumps({'import_ms': import_ms, 'loaded_at_import': loaded, 'first_use_ms': first_use}))
+''' % {'heavy': HEAVY_MODULES}
+
+
+def parse_importtime(stderr, top):
+    """Return the `top` modules with the largest cumulative import time"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        # Skip the column header line
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        self_us, cumulative_us, name = fields
+        entries.append({
+            'module': name.strip(),
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000
+        })
+    entries.sort(key=lambda entry: entry['cumulative_ms'], reverse=True)
+    return entries[:top]
+
+
+def run_child(*args):
+    env = dict(os.environ, FLASK_ENV=os.getenv('FLASK_ENV', 'production'))
+    result = subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'probe failed')
+    return result
+
+
+def run_once():
+    return json.loads(run_child('-c', PROBE).stdout.strip().splitlines()[-1])
+
+
+def profile_imports():
+    """Return `python -X importtime` output for importing the app alone"""
+    return run_child('-X', 'importtime', '-c', 'import app').stderr
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure app import (cold start) time')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    args = parser.parse_args(argv)
+
+    samples = [run_once() for _ in range(args.runs)]
+    import_times = [sample['import_ms'] for sample in samples]
+
+    report = {
+        'runs': args.runs,
+        'import_ms': {
+            'median': round(statistics.median(import_times), 2),
+            'min': round(min(import_times), 2),
+            'max': round(max(import_times), 2)
+        },
+        'loaded_at_import': samples[-1]['loaded_at_import'],
+        'first_use_ms': samples[-1]['first_use_ms'],
+        'slowest_imports': parse_importtime(profile_imports(), args.top)
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Small thread-safe in-process caches shared by the Flask app.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with an optional per-entry TTL.
+
+    Safe to share between request threads. Hit, miss and eviction counters
+    are kept so they can be reported alongside other app metrics.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key, factory):
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def discard_where(self, predicate):
+        """Remove every entry whose (key, value) matches predicate"""
+        with self._lock:
+            stale = [key for key, (value, _) in self._data.items() if predicate(key, value)]
+            for key in stale:
+                del self._data[key]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
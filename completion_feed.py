@@ -0,0 +1,102 @@
+"""
+In-process publish/subscribe for new completions, per exercise.
+
+`api_complete` publishes each accepted completion; the completions stream
+endpoint subscribes while a client is connected. Delivery is best effort:
+a subscriber that falls `max_pending` events behind is dropped (its stream
+ends and the client reconnects with its cursor), and completions accepted
+by other processes only reach a client through the snapshot it gets on
+(re)connecting.
+
+Subscriptions made with `subscribe(exercise_id, loop)` are read with
+`await get_async()` from that event loop (see asgi.py); publishers on
+other threads wake it with `call_soon_threadsafe`.
+"""
+
+import asyncio
+import queue
+import threading
+
+
+class Subscription:
+    def __init__(self, exercise_id, max_pending, loop=None):
+        self.exercise_id = exercise_id
+        self.events = queue.Queue(maxsize=max_pending)
+        self.dropped = False
+        self._loop = loop
+        self._ready = asyncio.Event() if loop is not None else None
+
+    def get(self, timeout):
+        """Return the next event, or None if none arrived within timeout seconds"""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def get_async(self, timeout):
+        """get() for a subscription made with a loop, without blocking it"""
+        while True:
+            try:
+                return self.events.get_nowait()
+            except queue.Empty:
+                pass
+            if self.dropped:
+                return None
+            self._ready.clear()
+            # An event put before the clear() would otherwise be missed
+            if not self.events.empty():
+                continue
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+    def put(self, event):
+        """Queue an event; returns False if the subscriber is too far behind"""
+        try:
+            self.events.put_nowait(event)
+            return True
+        except queue.Full:
+            self.dropped = True
+            return False
+        finally:
+            self._wake()
+
+    def _wake(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._ready.set)
+
+
+class CompletionFeed:
+    def __init__(self, max_pending=1000):
+        self.max_pending = max_pending
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, exercise_id, loop=None):
+        subscription = Subscription(exercise_id, self.max_pending, loop)
+        with self._lock:
+            self._subscribers.setdefault(exercise_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.exercise_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.exercise_id]
+
+    def publish(self, exercise_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(exercise_id, ()))
+        for subscription in subscribers:
+            if not subscription.put(event):
+                self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'exercises': len(self._subscribers),
+                'subscribers': sum(len(s) for s in self._subscribers.values())
+            }
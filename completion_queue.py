@@ -0,0 +1,185 @@
+"""
+Write-behind batching for completion inserts.
+
+Validated completions are queued in memory and written by a background
+thread in batches, either every `flush_interval` seconds or as soon as
+`max_batch` rows are waiting. The queue is bounded: when it is full,
+submit() says so and the caller records the completion synchronously.
+
+Written rows are passed to `on_written(rows)` after each successful
+insert, so anything derived from the table is refreshed only once the
+rows are actually there.
+
+When a batch insert fails its rows are written one at a time, so one bad
+row (say, for an exercise deleted by another worker) can't hold back the
+rows queued with it. Rows that still fail are retried on later flushes, up
+to `max_retries` times, and then dropped, logged and passed to
+`on_dropped(rows)`.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('exercise_tracker.completion_queue')
+
+
+class CompletionWriter:
+    QUEUED = 'queued'
+    DUPLICATE = 'duplicate'
+    FULL = 'full'
+
+    def __init__(self, write_batch, max_batch=100, flush_interval=0.2, max_queue=5000, max_retries=3,
+                 on_written=None, on_dropped=None):
+        """write_batch(rows) inserts a list of completion rows in one request"""
+        self.write_batch = write_batch
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.on_written = on_written
+        self.on_dropped = on_dropped
+        self._queue = deque()
+        # (student_id, exercise_id) of every queued row, so repeat submissions
+        # inside the batch window are suppressed
+        self._pending = set()
+        # Failed writes so far for rows waiting to be retried
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self.flushed = 0
+        self.failed_batches = 0
+        self.dropped = 0
+        atexit.register(self.stop)
+
+    def submit(self, row):
+        """Queue a completion row; returns QUEUED, DUPLICATE or FULL"""
+        key = (row['student_id'], row['exercise_id'])
+        with self._lock:
+            if key in self._pending:
+                return self.DUPLICATE
+            if len(self._queue) >= self.max_queue or self._stopping:
+                return self.FULL
+            self._queue.append(row)
+            self._pending.add(key)
+            self._ensure_started()
+            if len(self._queue) >= self.max_batch:
+                self._wakeup.notify()
+        return self.QUEUED
+
+    def is_pending(self, student_id, exercise_id):
+        with self._lock:
+            return (student_id, exercise_id) in self._pending
+
+    def pending_students(self, exercise_id):
+        """Ids of the students with a completion of exercise_id not written yet"""
+        with self._lock:
+            return {student_id for student_id, pending_exercise_id in self._pending if pending_exercise_id == exercise_id}
+
+    def flush(self):
+        """Write everything queued so far, one batch at a time.
+
+        Returns False if some rows failed and were put back on the queue.
+        """
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+                if not batch:
+                    return True
+
+                written, failed = self._write(batch)
+                retry, dropped = [], []
+                with self._lock:
+                    for row in failed:
+                        key = (row['student_id'], row['exercise_id'])
+                        attempts = self._attempts.get(key, 0) + 1
+                        # Nothing is retried once we are shutting down
+                        if attempts > self.max_retries or self._stopping:
+                            dropped.append(row)
+                        else:
+                            self._attempts[key] = attempts
+                            retry.append(row)
+                    for row in written + dropped:
+                        key = (row['student_id'], row['exercise_id'])
+                        self._pending.discard(key)
+                        self._attempts.pop(key, None)
+                    self._queue.extendleft(reversed(retry))
+
+                self.flushed += len(written)
+                self.dropped += len(dropped)
+                for row in dropped:
+                    logger.error("Dropped queued completion for student %s, exercise %s",
+                                 row['student_id'], row['exercise_id'])
+                if written and self.on_written:
+                    self.on_written(written)
+                if dropped and self.on_dropped:
+                    self.on_dropped(dropped)
+                if retry:
+                    return False
+
+    def _write(self, batch):
+        """Write a batch, falling back to one row at a time if it fails.
+
+        Returns (written rows, failed rows).
+        """
+        try:
+            self.write_batch(batch)
+            return batch, []
+        except Exception as e:
+            self.failed_batches += 1
+            logger.exception("Failed to write %d queued completions: %s", len(batch), e)
+
+        if len(batch) == 1:
+            return [], batch
+
+        written, failed = [], []
+        for row in batch:
+            try:
+                self.write_batch([row])
+                written.append(row)
+            except Exception as e:
+                logger.warning("Failed to write completion for student %s, exercise %s: %s",
+                               row['student_id'], row['exercise_id'], e)
+                failed.append(row)
+        return written, failed
+
+    def stop(self):
+        """Stop the background thread and flush what is left"""
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def stats(self):
+        return {
+            'queued': len(self._queue),
+            'max_queue': self.max_queue,
+            'flushed': self.flushed,
+            'failed_batches': self.failed_batches,
+            'dropped': self.dropped
+        }
+
+    def _ensure_started(self):
+        # Started lazily so each forked worker process gets its own thread
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='completion-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._stopping and len(self._queue) < self.max_batch:
+                    self._wakeup.wait(self.flush_interval)
+                if self._stopping:
+                    return
+            if not self.flush():
+                # Back off briefly after a failed write before retrying
+                time.sleep(self.flush_interval)
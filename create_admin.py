@@ -1,17 +1,19 @@
 #!/usr/bin/env python3
 """
-Script to create or update admin user in Supabase database.
-Uses environment variables for credentials.
+Script to create or update admin user in the database.
+Uses environment variables for credentials and DATA_BACKEND to pick the
+backend (see repositories/__init__.py).
 """
 
 import os
 import bcrypt
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from repositories import create_repository
 
 # Load environment variables
 load_dotenv()
 
+DATA_BACKEND = os.getenv('DATA_BACKEND', 'supabase')
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'admin')
@@ -20,36 +22,29 @@ ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin123')
 def create_or_update_admin():
     """Create or update admin user in the database"""
     
-    if not SUPABASE_URL or not SUPABASE_KEY:
+    if DATA_BACKEND == 'supabase' and (not SUPABASE_URL or not SUPABASE_KEY):
         print("❌ ERROR: Missing Supabase credentials!")
         print("Please set SUPABASE_URL and SUPABASE_KEY in .env file")
         return False
     
     try:
-        # Initialize Supabase client
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        print("✅ Connected to Supabase")
+        repo = create_repository(DATA_BACKEND)
+        print(f"✅ Connected to {DATA_BACKEND} backend")
         
         # Hash the password
         password_hash = bcrypt.hashpw(ADMIN_PASSWORD.encode('utf-8'), bcrypt.gensalt())
         
         # Check if admin user exists
-        response = supabase.table('admin').select('*').eq('username', ADMIN_USERNAME).execute()
+        admin = repo.admins.get_by_username(ADMIN_USERNAME)
         
-        if response.data and len(response.data) > 0:
+        if admin:
             # Update existing admin
-            admin_id = response.data[0]['id']
-            supabase.table('admin').update({
-                'password_hash': password_hash.decode('utf-8')
-            }).eq('id', admin_id).execute()
+            repo.admins.update_password(admin['id'], password_hash.decode('utf-8'))
             
             print(f"✅ Admin user '{ADMIN_USERNAME}' password updated successfully!")
         else:
             # Create new admin
-            supabase.table('admin').insert({
-                'username': ADMIN_USERNAME,
-                'password_hash': password_hash.decode('utf-8')
-            }).execute()
+            repo.admins.create(ADMIN_USERNAME, password_hash.decode('utf-8'))
             
             print(f"✅ Admin user '{ADMIN_USERNAME}' created successfully!")
         
@@ -0,0 +1,83 @@
+"""
+Non-blocking, leveled logging for the app.
+
+Log records are put on an in-memory queue by the request threads and
+written to stderr by a background QueueListener thread, so request
+handling never waits on stdout/stderr I/O. If the queue is full, records
+are dropped and counted instead of blocking.
+
+Environment:
+- LOG_LEVEL: minimum level (default INFO, WARNING when FLASK_ENV=production)
+- LOG_SAMPLE_RATE: share of high-volume success messages to keep (default 1.0)
+- LOG_QUEUE_SIZE: maximum records waiting to be written (default 10000)
+"""
+
+import atexit
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+# Pass as `extra=SAMPLED` on hot-path success messages to log only a sample
+SAMPLED = {'sampled': True}
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+
+
+class DroppingQueueHandler(QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SampleFilter(logging.Filter):
+    """Keep only a share of records logged with extra=SAMPLED"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if getattr(record, 'sampled', False) and record.levelno < logging.WARNING:
+            return self.rate >= 1.0 or random.random() < self.rate
+        return True
+
+
+def default_level():
+    return 'WARNING' if os.getenv('FLASK_ENV') == 'production' else 'INFO'
+
+
+def configure_logging(name='exercise_tracker'):
+    """Set up the queued handler for `name` once per process and return its logger"""
+    logger = logging.getLogger(name)
+    if logger.handlers:
+        return logger
+
+    logger.setLevel(os.getenv('LOG_LEVEL', default_level()).upper())
+    logger.propagate = False
+
+    log_queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(SampleFilter(float(os.getenv('LOG_SAMPLE_RATE', '1.0'))))
+    logger.addHandler(handler)
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    return logger
+
+
+def mask_email(email):
+    """Keep enough of an email to debug with, without logging the address"""
+    local, _, domain = (email or '').partition('@')
+    return f"{local[:1]}***@{domain}" if domain else '***'
@@ -0,0 +1,131 @@
+"""
+Request and backend timing metrics.
+
+When enabled, `RequestMetrics.init_app(app)` installs request hooks that
+time every request, count the database round trips it makes (reported
+through `observe_round_trip`, see repositories/round_trips.py), add a
+Server-Timing header to the response, and keep Prometheus-style latency
+histograms that `render()` exposes in the text exposition format.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        """Yield exposition lines with cumulative bucket counts"""
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{format_labels(labels, le=bound)} {cumulative}'
+        yield f'{name}_bucket{format_labels(labels, le="+Inf")} {self.count}'
+        yield f'{name}_sum{format_labels(labels)} {self.sum:.6f}'
+        yield f'{name}_count{format_labels(labels)} {self.count}'
+
+
+def format_labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in items) + '}'
+
+
+@contextmanager
+def timed_segment(name):
+    """Time a block as a named Server-Timing segment of the current request.
+
+    A no-op outside requests or when metrics are disabled.
+    """
+    if not has_request_context() or 'server_timing' not in g:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        g.server_timing[name] = g.server_timing.get(name, 0.0) + time.perf_counter() - start
+
+
+class RequestMetrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._backend = {}
+        self._backend_per_request = {}
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def observe_round_trip(self, backend, seconds):
+        self._observe(self._backend, (('backend', backend),), seconds)
+        if has_request_context() and 'round_trips' in g:
+            g.round_trips += 1
+            g.db_seconds += seconds
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, help_text, series in (
+            ('http_request_duration_seconds', 'Request latency by endpoint', self._requests),
+            ('backend_round_trip_duration_seconds', 'Database round trip latency by backend', self._backend),
+            ('backend_round_trips_per_request', 'Database round trips made per request by endpoint',
+             self._backend_per_request),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            with self._lock:
+                for labels, histogram in sorted(series.items()):
+                    lines.extend(histogram.samples(name, dict(labels)))
+        return '\n'.join(lines) + '\n'
+
+    def _observe(self, series, labels, value, buckets=None):
+        with self._lock:
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(buckets or self.buckets)
+            histogram.observe(value)
+
+    def _before_request(self):
+        g.request_start = time.perf_counter()
+        g.round_trips = 0
+        g.db_seconds = 0.0
+        g.server_timing = {}
+
+    def _after_request(self, response):
+        elapsed = time.perf_counter() - g.request_start
+        endpoint = request.endpoint or 'unmatched'
+        self._observe(self._requests, (
+            ('endpoint', endpoint), ('method', request.method), ('status', response.status_code)
+        ), elapsed)
+        self._observe(self._backend_per_request, (('endpoint', endpoint),), g.round_trips,
+                      buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100))
+
+        timings = [
+            f'app;dur={elapsed * 1000:.2f}',
+            f'db;desc="{g.round_trips} round trips";dur={g.db_seconds * 1000:.2f}'
+        ]
+        timings.extend(f'{name};dur={seconds * 1000:.2f}' for name, seconds in g.server_timing.items())
+        response.headers['Server-Timing'] = ', '.join(timings)
+        return response
@@ -0,0 +1,65 @@
+-- Atomic completion recording for POST /api/complete/<token>
+--
+-- Run in the Supabase SQL Editor after the base schema (setup_database.sql).
+-- Resolves the QR token and student email and inserts the completion in a
+-- single round trip. The unique constraint makes concurrent double
+-- submissions from the same student safe.
+
+-- Keep the earliest completion if duplicates already exist
+delete from completion c
+using completion d
+where c.student_id = d.student_id
+  and c.exercise_id = d.exercise_id
+  and c.id > d.id;
+
+alter table completion
+    add constraint completion_student_exercise_key unique (student_id, exercise_id);
+
+create index if not exists exercise_qr_token_idx on exercise (qr_token);
+create index if not exists student_class_email_idx on student (class_id, lower(email));
+
+create or replace function record_completion(p_token text, p_email text)
+returns json
+language plpgsql
+as $$
+declare
+    v_exercise exercise%rowtype;
+    v_student student%rowtype;
+    v_completion_id bigint;
+    v_completed_at timestamp;
+begin
+    select * into v_exercise from exercise where qr_token = p_token;
+    if not found then
+        return json_build_object('status', 'exercise_not_found');
+    end if;
+
+    select * into v_student
+    from student
+    where class_id = v_exercise.class_id and lower(email) = lower(p_email)
+    order by id
+    limit 1;
+    if not found then
+        return json_build_object(
+            'status', 'student_not_found',
+            'exercise_id', v_exercise.id,
+            'class_id', v_exercise.class_id
+        );
+    end if;
+
+    insert into completion (student_id, exercise_id, student_email, completed_at)
+    values (v_student.id, v_exercise.id, p_email, now() at time zone 'utc')
+    on conflict (student_id, exercise_id) do nothing
+    returning id, completed_at into v_completion_id, v_completed_at;
+
+    return json_build_object(
+        'status', case when v_completion_id is null then 'already_completed' else 'recorded' end,
+        'completion_id', v_completion_id,
+        'completed_at', v_completed_at,
+        'exercise_id', v_exercise.id,
+        'exercise_name', v_exercise.name,
+        'class_id', v_exercise.class_id,
+        'student_id', v_student.id,
+        'student_name', v_student.name
+    );
+end;
+$$;
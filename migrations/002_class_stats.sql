@@ -0,0 +1,211 @@
+-- Precomputed completion statistics for GET /api/classes/<id>/stats
+--
+-- Run in the Supabase SQL Editor after 001_record_completion.sql.
+-- Counts are kept up to date by triggers, so reading a class's stats never
+-- scans its completions, and every writer (record_completion, batched
+-- write-behind inserts, deletes, cascades) is covered.
+--
+-- A completion counts while both its student and its exercise exist.
+
+create table if not exists class_stats (
+    class_id bigint primary key references class (id) on delete cascade,
+    student_count integer not null default 0,
+    exercise_count integer not null default 0,
+    completion_count integer not null default 0
+);
+
+create table if not exists student_stats (
+    student_id bigint primary key references student (id) on delete cascade,
+    class_id bigint not null,
+    completion_count integer not null default 0
+);
+
+create table if not exists exercise_stats (
+    exercise_id bigint primary key references exercise (id) on delete cascade,
+    class_id bigint not null,
+    completion_count integer not null default 0
+);
+
+create index if not exists student_stats_class_idx on student_stats (class_id);
+create index if not exists exercise_stats_class_idx on exercise_stats (class_id);
+create index if not exists completion_student_idx on completion (student_id);
+
+-- Backfill existing rows
+insert into class_stats (class_id, student_count, exercise_count, completion_count)
+select c.id,
+       (select count(*) from student s where s.class_id = c.id),
+       (select count(*) from exercise e where e.class_id = c.id),
+       (select count(*) from completion co
+            join student s on s.id = co.student_id
+            join exercise e on e.id = co.exercise_id
+        where e.class_id = c.id)
+from class c
+on conflict do nothing;
+
+insert into student_stats (student_id, class_id, completion_count)
+select s.id, s.class_id,
+       (select count(*) from completion co
+            join exercise e on e.id = co.exercise_id
+        where co.student_id = s.id)
+from student s
+where s.class_id is not null
+on conflict do nothing;
+
+insert into exercise_stats (exercise_id, class_id, completion_count)
+select e.id, e.class_id,
+       (select count(*) from completion co
+            join student s on s.id = co.student_id
+        where co.exercise_id = e.id)
+from exercise e
+where e.class_id is not null
+on conflict do nothing;
+
+-- class
+
+create or replace function class_stats_on_class_insert()
+returns trigger
+language plpgsql
+as $$
+begin
+    insert into class_stats (class_id) values (new.id) on conflict do nothing;
+    return new;
+end;
+$$;
+
+drop trigger if exists class_stats_class_insert on class;
+create trigger class_stats_class_insert
+    after insert on class
+    for each row execute function class_stats_on_class_insert();
+
+-- student
+
+create or replace function class_stats_on_student_insert()
+returns trigger
+language plpgsql
+as $$
+begin
+    insert into student_stats (student_id, class_id) values (new.id, new.class_id) on conflict do nothing;
+    update class_stats set student_count = student_count + 1 where class_id = new.class_id;
+    return new;
+end;
+$$;
+
+create or replace function class_stats_on_student_delete()
+returns trigger
+language plpgsql
+as $$
+declare
+    v_completed integer;
+begin
+    delete from student_stats where student_id = old.id
+    returning completion_count into v_completed;
+
+    if found then
+        update exercise_stats
+        set completion_count = completion_count - 1
+        where exercise_id in (select exercise_id from completion where student_id = old.id);
+
+        update class_stats
+        set student_count = student_count - 1,
+            completion_count = completion_count - v_completed
+        where class_id = old.class_id;
+    end if;
+    return old;
+end;
+$$;
+
+drop trigger if exists class_stats_student_insert on student;
+create trigger class_stats_student_insert
+    after insert on student
+    for each row execute function class_stats_on_student_insert();
+
+drop trigger if exists class_stats_student_delete on student;
+create trigger class_stats_student_delete
+    before delete on student
+    for each row execute function class_stats_on_student_delete();
+
+-- exercise
+
+create or replace function class_stats_on_exercise_insert()
+returns trigger
+language plpgsql
+as $$
+begin
+    insert into exercise_stats (exercise_id, class_id) values (new.id, new.class_id) on conflict do nothing;
+    update class_stats set exercise_count = exercise_count + 1 where class_id = new.class_id;
+    return new;
+end;
+$$;
+
+create or replace function class_stats_on_exercise_delete()
+returns trigger
+language plpgsql
+as $$
+declare
+    v_completed integer;
+begin
+    delete from exercise_stats where exercise_id = old.id
+    returning completion_count into v_completed;
+
+    if found then
+        update student_stats
+        set completion_count = completion_count - 1
+        where student_id in (select student_id from completion where exercise_id = old.id);
+
+        update class_stats
+        set exercise_count = exercise_count - 1,
+            completion_count = completion_count - v_completed
+        where class_id = old.class_id;
+    end if;
+    return old;
+end;
+$$;
+
+drop trigger if exists class_stats_exercise_insert on exercise;
+create trigger class_stats_exercise_insert
+    after insert on exercise
+    for each row execute function class_stats_on_exercise_insert();
+
+drop trigger if exists class_stats_exercise_delete on exercise;
+create trigger class_stats_exercise_delete
+    before delete on exercise
+    for each row execute function class_stats_on_exercise_delete();
+
+-- completion
+
+create or replace function class_stats_on_completion_change()
+returns trigger
+language plpgsql
+as $$
+declare
+    v_row completion%rowtype;
+    v_delta integer;
+    v_class_id bigint;
+begin
+    if tg_op = 'INSERT' then
+        v_row := new;
+        v_delta := 1;
+    else
+        v_row := old;
+        v_delta := -1;
+    end if;
+
+    -- Only completions whose student and exercise both still exist count
+    select es.class_id into v_class_id
+    from exercise_stats es
+    where es.exercise_id = v_row.exercise_id
+      and exists (select 1 from student_stats ss where ss.student_id = v_row.student_id);
+
+    if found then
+        update student_stats set completion_count = completion_count + v_delta where student_id = v_row.student_id;
+        update exercise_stats set completion_count = completion_count + v_delta where exercise_id = v_row.exercise_id;
+        update class_stats set completion_count = completion_count + v_delta where class_id = v_class_id;
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists class_stats_completion_change on completion;
+create trigger class_stats_completion_change
+    after insert or delete on completion
+    for each row execute function class_stats_on_completion_change();
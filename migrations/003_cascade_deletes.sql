@@ -0,0 +1,104 @@
+-- Cascading deletes and orphan cleanup
+--
+-- Run in the Supabase SQL Editor after 002_class_stats.sql.
+-- Deleting a class, student or exercise now removes everything that
+-- depends on it in the same statement (one round trip, one transaction).
+--
+-- The foreign keys are added NOT VALID so existing orphaned rows don't
+-- block the migration; new deletes cascade immediately. Purge the existing
+-- orphans in batches with `python purge_orphans.py`, then run the VALIDATE
+-- statements at the end of this file.
+
+alter table student drop constraint if exists student_class_id_fkey;
+alter table student
+    add constraint student_class_id_fkey
+    foreign key (class_id) references class (id) on delete cascade not valid;
+
+alter table exercise drop constraint if exists exercise_class_id_fkey;
+alter table exercise
+    add constraint exercise_class_id_fkey
+    foreign key (class_id) references class (id) on delete cascade not valid;
+
+alter table completion drop constraint if exists completion_student_id_fkey;
+alter table completion
+    add constraint completion_student_id_fkey
+    foreign key (student_id) references student (id) on delete cascade not valid;
+
+alter table completion drop constraint if exists completion_exercise_id_fkey;
+alter table completion
+    add constraint completion_exercise_id_fkey
+    foreign key (exercise_id) references exercise (id) on delete cascade not valid;
+
+-- Cascades look up dependents by these columns
+create index if not exists student_class_idx on student (class_id);
+create index if not exists exercise_class_idx on exercise (class_id);
+create index if not exists completion_exercise_idx on completion (exercise_id);
+create index if not exists completion_student_idx on completion (student_id);
+
+-- Delete a class with its students, exercises and completions; returns the
+-- ids of the deleted exercises (the app evicts their cached QR codes)
+create or replace function delete_class(p_class_id bigint)
+returns json
+language plpgsql
+as $$
+declare
+    v_exercise_ids json;
+begin
+    select coalesce(json_agg(id order by id), '[]'::json) into v_exercise_ids
+    from exercise
+    where class_id = p_class_id;
+
+    delete from class where id = p_class_id;
+
+    return v_exercise_ids;
+end;
+$$;
+
+-- Delete up to p_batch_size orphaned rows from one table ('student',
+-- 'exercise' or 'completion') and return how many were deleted. Students
+-- and exercises are orphans when their class is gone; completions when
+-- their student or exercise is gone.
+create or replace function purge_orphans(p_table text, p_batch_size integer)
+returns integer
+language plpgsql
+as $$
+declare
+    v_deleted integer;
+begin
+    if p_table = 'student' then
+        delete from student
+        where id in (
+            select s.id from student s
+            where not exists (select 1 from class c where c.id = s.class_id)
+            limit p_batch_size
+        );
+    elsif p_table = 'exercise' then
+        delete from exercise
+        where id in (
+            select e.id from exercise e
+            where not exists (select 1 from class c where c.id = e.class_id)
+            limit p_batch_size
+        );
+    elsif p_table = 'completion' then
+        delete from completion
+        where id in (
+            select co.id from completion co
+            where not exists (select 1 from student s where s.id = co.student_id)
+               or not exists (select 1 from exercise e where e.id = co.exercise_id)
+            limit p_batch_size
+        );
+    else
+        raise exception 'Unknown table %', p_table;
+    end if;
+
+    get diagnostics v_deleted = row_count;
+    return v_deleted;
+end;
+$$;
+
+-- After purge_orphans.py reports no orphans left:
+--
+-- alter table student validate constraint student_class_id_fkey;
+-- alter table exercise validate constraint exercise_class_id_fkey;
+-- alter table completion validate constraint completion_student_id_fkey;
+-- alter table completion validate constraint completion_exercise_id_fkey;
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Maintenance script to delete orphaned rows left behind by deletes that
+predate the cascading foreign keys (migrations/003_cascade_deletes.sql):
+students and exercises whose class is gone, and completions whose student
+or exercise is gone.
+
+Rows are deleted in batches (--batch-size, default 1000), each its own
+short transaction, so the script can run against a live database.
+Uses DATA_BACKEND to pick the backend (see repositories/__init__.py).
+"""
+
+import argparse
+import os
+import time
+from dotenv import load_dotenv
+from repositories import create_repository
+
+# Load environment variables
+load_dotenv()
+
+DATA_BACKEND = os.getenv('DATA_BACKEND', 'supabase')
+
+# Parents first: with the cascading keys in place, purging students and
+# exercises also removes their completions
+TABLES = ('students', 'exercises', 'completions')
+
+def purge_table(table, batch_size, pause):
+    """Purge one table's orphans batch by batch; returns the total deleted"""
+    total = 0
+    while True:
+        deleted = table.purge_orphans(batch_size)
+        total += deleted
+        if deleted < batch_size:
+            return total
+        print(f"  ... {total} deleted so far")
+        time.sleep(pause)
+
+def purge_orphans(batch_size, pause):
+    repo = create_repository(DATA_BACKEND)
+    print(f"✅ Connected to {DATA_BACKEND} backend")
+    
+    totals = {}
+    for name in TABLES:
+        print(f"Purging orphaned {name}...")
+        totals[name] = purge_table(getattr(repo, name), batch_size, pause)
+        print(f"✅ {totals[name]} orphaned {name} deleted")
+    return totals
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Delete orphaned students, exercises and completions')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--pause', type=float, default=0.1, help='seconds to wait between batches')
+    args = parser.parse_args()
+    
+    print("="*50)
+    print("Orphan Cleanup")
+    print("="*50)
+    purge_orphans(args.batch_size, args.pause)
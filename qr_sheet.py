@@ -0,0 +1,139 @@
+"""
+QR code rendering and printable QR sheets.
+
+`render_qr_png` is a plain module-level function so it can run in a process
+pool: the app renders a class's codes in parallel, then `sheet_pdf` /
+`sheet_png` lay the PNGs out as captioned tiles, one fixed-size cell per
+exercise. qrcode and Pillow are imported on first use.
+"""
+
+import io
+
+# US Letter at 150 dpi
+PAGE_SIZE = (1275, 1650)
+PAGE_DPI = 150
+PAGE_MARGIN = 75
+TITLE_HEIGHT = 60
+CAPTION_HEIGHT = 50
+TILE_PADDING = 20
+TITLE_FONT_SIZE = 32
+CAPTION_FONT_SIZE = 24
+PNG_COLUMNS = 4
+
+
+def render_qr_png(qr_url, version, box_size, border):
+    import qrcode
+
+    qr = qrcode.QRCode(version=version, box_size=box_size, border=border)
+    qr.add_data(qr_url)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def load_font(size):
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.truetype('DejaVuSans.ttf', size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def fit_text(draw, text, font, width):
+    """Shorten text with an ellipsis until it fits in width pixels"""
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + '...', font=font) > width:
+        text = text[:-1]
+    return text.rstrip() + '...'
+
+
+def draw_centered(draw, text, font, box):
+    left, top, right, bottom = box
+    text = fit_text(draw, text, font, right - left)
+    x0, y0, x1, y1 = draw.textbbox((0, 0), text, font=font)
+    x = left + (right - left - (x1 - x0)) // 2 - x0
+    y = top + (bottom - top - (y1 - y0)) // 2 - y0
+    draw.text((x, y), text, fill='black', font=font)
+
+
+def make_tiles(codes):
+    """Turn [(name, png)] into same-sized RGB tiles with the name under each QR"""
+    from PIL import Image, ImageDraw
+
+    images = [(name, Image.open(io.BytesIO(png)).convert('RGB')) for name, png in codes]
+    qr_size = max(max(img.size) for _, img in images)
+    width = qr_size + 2 * TILE_PADDING
+    height = qr_size + CAPTION_HEIGHT + 2 * TILE_PADDING
+    font = load_font(CAPTION_FONT_SIZE)
+
+    tiles = []
+    for name, img in images:
+        tile = Image.new('RGB', (width, height), 'white')
+        tile.paste(img, ((width - img.width) // 2, TILE_PADDING + (qr_size - img.height) // 2))
+        draw = ImageDraw.Draw(tile)
+        draw.rectangle((0, 0, width - 1, height - 1), outline=(200, 200, 200))
+        draw_centered(draw, name, font, (TILE_PADDING, TILE_PADDING + qr_size, width - TILE_PADDING, height - TILE_PADDING))
+        tiles.append(tile)
+    return tiles
+
+
+def grid(tiles, columns, size, origin, title=None):
+    """Paste tiles row by row onto a white image of the given size"""
+    from PIL import Image, ImageDraw
+
+    sheet = Image.new('RGB', size, 'white')
+    if title:
+        draw_centered(ImageDraw.Draw(sheet), title, load_font(TITLE_FONT_SIZE),
+                      (origin[0], origin[1] - TITLE_HEIGHT, size[0] - origin[0], origin[1]))
+    for i, tile in enumerate(tiles):
+        row, column = divmod(i, columns)
+        sheet.paste(tile, (origin[0] + column * tile.width, origin[1] + row * tile.height))
+    return sheet
+
+
+def sheet_pdf(codes, title=None):
+    """Lay [(name, png)] out on as many Letter pages as needed and return the PDF bytes"""
+    tiles = make_tiles(codes)
+    tile_width, tile_height = tiles[0].size
+    usable_width = PAGE_SIZE[0] - 2 * PAGE_MARGIN
+    usable_height = PAGE_SIZE[1] - 2 * PAGE_MARGIN - (TITLE_HEIGHT if title else 0)
+
+    # Codes too large for the page are scaled down rather than cropped
+    scale = min(1.0, usable_width / tile_width, usable_height / tile_height)
+    if scale < 1.0:
+        tile_width, tile_height = int(tile_width * scale), int(tile_height * scale)
+        tiles = [tile.resize((tile_width, tile_height)) for tile in tiles]
+
+    columns = usable_width // tile_width
+    per_page = columns * (usable_height // tile_height)
+
+    # Center the grid horizontally
+    left = (PAGE_SIZE[0] - columns * tile_width) // 2
+    top = PAGE_MARGIN + (TITLE_HEIGHT if title else 0)
+    pages = [
+        grid(tiles[start:start + per_page], columns, PAGE_SIZE, (left, top), title)
+        for start in range(0, len(tiles), per_page)
+    ]
+
+    buf = io.BytesIO()
+    pages[0].save(buf, format='PDF', save_all=True, append_images=pages[1:], resolution=PAGE_DPI)
+    return buf.getvalue()
+
+
+def sheet_png(codes, title=None, columns=PNG_COLUMNS):
+    """Lay [(name, png)] out as one tiled PNG and return its bytes"""
+    tiles = make_tiles(codes)
+    tile_width, tile_height = tiles[0].size
+    columns = min(columns, len(tiles))
+    rows = -(-len(tiles) // columns)
+    top = TITLE_HEIGHT if title else 0
+
+    sheet = grid(tiles, columns, (columns * tile_width, top + rows * tile_height), (0, top), title)
+    buf = io.BytesIO()
+    sheet.save(buf, format='PNG', optimize=True)
+    return buf.getvalue()
@@ -0,0 +1,66 @@
+"""
+In-process token-bucket rate limiting.
+
+Each key (an IP address, a username, ...) gets a bucket holding up to
+`capacity` tokens that refills at `rate` tokens per second; every attempt
+takes one. `wait()` checks buckets without taking from them, for limits that
+are only charged after the fact (e.g. on failed logins). Buckets live in a bounded LRU so a flood of distinct keys can't
+grow memory without limit; an evicted bucket starts full again.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    def __init__(self, capacity, rate, maxsize=10000):
+        self.capacity = capacity
+        self.rate = rate
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _level(self, key, now):
+        tokens, updated_at = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated_at) * self.rate)
+
+    def _refill(self, key, now):
+        tokens = self._level(key, now)
+        self._buckets.pop(key, None)
+        return tokens
+
+    def _wait(self, levels):
+        return max(((1 - tokens) / self.rate for tokens in levels if tokens < 1), default=0)
+
+    def take(self, *keys):
+        """Take one token from each key's bucket if all have one.
+
+        Returns 0 when allowed, otherwise the seconds until every bucket has
+        a token again (nothing is taken in that case).
+        """
+        with self._lock:
+            now = time.monotonic()
+            levels = {key: self._refill(key, now) for key in keys}
+            wait = self._wait(levels.values())
+            for key, tokens in levels.items():
+                self._buckets[key] = (tokens if wait else tokens - 1, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            if wait:
+                self.rejected += 1
+            return wait
+
+    def wait(self, *keys):
+        """Return 0 if every key's bucket has a token, otherwise the seconds
+        until they all do, without taking any"""
+        with self._lock:
+            wait = self._wait([self._level(key, time.monotonic()) for key in keys])
+            if wait:
+                self.rejected += 1
+            return wait
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._buckets), 'rejected': self.rejected}
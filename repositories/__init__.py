@@ -0,0 +1,32 @@
+"""
+Data-access layer for the app and scripts.
+
+`create_repository()` picks the backend from DATA_BACKEND:
+
+- `supabase` (default): the hosted database, using SUPABASE_URL / SUPABASE_KEY
+- `sqlite`: an embedded database at SQLITE_PATH (default in-memory), for
+  local development and performance testing
+"""
+
+import os
+
+from repositories.base import LazyRepository, Repository
+
+BACKENDS = ('supabase', 'sqlite')
+
+
+def create_repository(backend=None):
+    backend = backend or os.getenv('DATA_BACKEND', 'supabase')
+
+    if backend == 'supabase':
+        from repositories.supabase_backend import create_supabase_repository
+        return create_supabase_repository(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
+
+    if backend == 'sqlite':
+        from repositories.sqlite_backend import create_sqlite_repository
+        return create_sqlite_repository(os.getenv('SQLITE_PATH', ':memory:'))
+
+    raise ValueError(f"Unknown DATA_BACKEND '{backend}' (expected one of: {', '.join(BACKENDS)})")
+
+
+__all__ = ['BACKENDS', 'LazyRepository', 'Repository', 'create_repository']
@@ -0,0 +1,64 @@
+"""
+Async access to the data behind the student completion routes.
+
+`create_async_repository()` mirrors `create_repository()` with the same
+table layout, but every method is a coroutine:
+
+- `supabase`: native async PostgREST requests over one pooled connection
+  set, so many scans can be waiting on the database from a single process.
+  Only the methods the completion routes use are implemented:
+  `exercises.get_by_token`, `students.roster`, `completions.record`,
+  `completions.student_ids_for_exercise` and `completions.list_for_exercise`.
+- other backends: the sync repository, with each call run in a worker
+  thread so the event loop is never blocked.
+"""
+
+import asyncio
+import functools
+import os
+
+from repositories import BACKENDS, create_repository
+from repositories.base import TABLES
+
+
+class ThreadedAsyncTable:
+    def __init__(self, table, repo):
+        self._table = table
+        self._repo = repo
+
+    def __getattr__(self, method):
+        attr = getattr(getattr(self._repo, self._table), method)
+        if method.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+
+        return call
+
+
+class ThreadedAsyncRepository:
+    """Run a sync repository's methods in worker threads"""
+
+    def __init__(self, repo):
+        self.target = repo
+        for table in TABLES:
+            setattr(self, table, ThreadedAsyncTable(table, repo))
+
+    @property
+    def name(self):
+        return self.target.name
+
+
+def create_async_repository(backend=None):
+    backend = backend or os.getenv('DATA_BACKEND', 'supabase')
+
+    if backend == 'supabase':
+        from repositories.supabase_backend import create_supabase_async_repository
+        return create_supabase_async_repository(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
+
+    if backend in BACKENDS:
+        return ThreadedAsyncRepository(create_repository(backend))
+
+    raise ValueError(f"Unknown DATA_BACKEND '{backend}' (expected one of: {', '.join(BACKENDS)})")
@@ -0,0 +1,186 @@
+"""
+Data-access contract shared by every backend.
+
+Each backend provides one repository per table. Methods take and return
+plain dicts (the same shapes the Supabase API returns), so routes don't
+depend on which backend is configured.
+"""
+
+import threading
+
+# Table attributes of a Repository
+TABLES = ('admins', 'classes', 'students', 'exercises', 'completions')
+
+
+class AdminRepository:
+    def get_by_username(self, username):
+        """Get an admin row by username, or None"""
+        raise NotImplementedError
+
+    def create(self, username, password_hash):
+        raise NotImplementedError
+
+    def update_password(self, admin_id, password_hash):
+        raise NotImplementedError
+
+
+class ClassRepository:
+    def list_with_student_counts(self):
+        """Get every class as {'id', 'name', 'code', 'student_count'}"""
+        raise NotImplementedError
+
+    def get_with_student_count(self, class_id):
+        raise NotImplementedError
+
+    def get(self, class_id):
+        """Get a class as {'id', 'name', 'code'}, or None"""
+        raise NotImplementedError
+
+    def create(self, name, code, created_at):
+        raise NotImplementedError
+
+    def update(self, class_id, name, code):
+        """Update a class and return the new row, or None if it doesn't exist"""
+        raise NotImplementedError
+
+    def stats(self, class_id):
+        """Get the precomputed completion counts for a class, or None if it doesn't exist:
+        {'student_count', 'exercise_count', 'completion_count',
+         'students': [{'id', 'name', 'completion_count'}],
+         'exercises': [{'id', 'name', 'completion_count'}]}, lists ordered by id"""
+        raise NotImplementedError
+
+    def delete(self, class_id):
+        """Delete a class with its students, exercises and completions in one
+        transaction; returns the deleted exercise ids"""
+        raise NotImplementedError
+
+
+class StudentRepository:
+    def list_for_class(self, class_id, after=None, limit=None):
+        """Get {'id', 'name', 'email'} for a class's students ordered by id,
+        optionally only those with id > after, at most limit rows"""
+        raise NotImplementedError
+
+    def roster(self, class_id):
+        """Get {'id', 'name', 'email'} for every student in a class, ordered by id"""
+        raise NotImplementedError
+
+    def create(self, class_id, name, email):
+        raise NotImplementedError
+
+    def create_many(self, class_id, students):
+        """Insert [{'name', 'email'}] in one request and return the new rows"""
+        raise NotImplementedError
+
+    def delete(self, student_id):
+        """Delete a student and their completions; returns the deleted row, or None"""
+        raise NotImplementedError
+
+    def purge_orphans(self, batch_size):
+        """Delete up to batch_size students whose class no longer exists; returns the count"""
+        raise NotImplementedError
+
+
+class ExerciseRepository:
+    def list_with_completion_counts(self, class_id, after=None, limit=None):
+        """Get a class's exercises as {'id', 'name', 'created_at', 'completion_count'}
+        ordered by id, optionally only those with id > after, at most limit rows"""
+        raise NotImplementedError
+
+    def list_for_class(self, class_id):
+        """Get {'id', 'name', 'qr_token'} for every exercise in a class, ordered by id"""
+        raise NotImplementedError
+
+    def get(self, exercise_id):
+        raise NotImplementedError
+
+    def get_by_token(self, token):
+        """Get (exercise, class_info) for a QR token, or (None, None)"""
+        raise NotImplementedError
+
+    def create(self, class_id, name, qr_token, created_at):
+        raise NotImplementedError
+
+    def delete(self, exercise_id):
+        """Delete an exercise and its completions; returns the deleted row, or None"""
+        raise NotImplementedError
+
+    def purge_orphans(self, batch_size):
+        """Delete up to batch_size exercises whose class no longer exists; returns the count"""
+        raise NotImplementedError
+
+
+class CompletionRepository:
+    def list_for_exercise(self, exercise_id, after=None, limit=None):
+        """Get an exercise's completions as {'id', 'student_email', 'student_name', 'completed_at'}
+        ordered by id, optionally only those with id > after, at most limit rows"""
+        raise NotImplementedError
+
+    def student_ids_for_exercise(self, exercise_id):
+        """Get the ids of the students who have completed an exercise"""
+        raise NotImplementedError
+
+    def iter_for_class(self, class_id, page_size):
+        """Yield {'id', 'student_id', 'exercise_id', 'completed_at'} for a class, ordered by student"""
+        raise NotImplementedError
+
+    def record(self, token, email):
+        """Resolve a QR token and email and record the completion atomically.
+
+        Returns a dict whose 'status' is one of 'recorded', 'already_completed',
+        'exercise_not_found' or 'student_not_found', plus the resolved ids and
+        names (see migrations/001_record_completion.sql).
+        """
+        raise NotImplementedError
+
+    def insert_many(self, rows):
+        """Insert completion rows, skipping any that already exist"""
+        raise NotImplementedError
+
+    def purge_orphans(self, batch_size):
+        """Delete up to batch_size completions whose student or exercise no longer
+        exists; returns the count"""
+        raise NotImplementedError
+
+
+class Repository:
+    """All table repositories for one backend"""
+
+    name = None
+
+    def __init__(self, admins, classes, students, exercises, completions):
+        self.admins = admins
+        self.classes = classes
+        self.students = students
+        self.exercises = exercises
+        self.completions = completions
+
+
+class LazyRepository(Repository):
+    """Creates the real repository on first use and reuses it for the process.
+
+    Keeps backend client setup (and importing its libraries) off the import
+    path, which matters for serverless cold starts.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._repo = None
+        self._lock = threading.Lock()
+
+    @property
+    def target(self):
+        if self._repo is None:
+            with self._lock:
+                if self._repo is None:
+                    self._repo = self._factory()
+        return self._repo
+
+    @property
+    def name(self):
+        return self.target.name
+
+    def __getattr__(self, table):
+        # Only called for attributes not set in __init__, i.e. the tables
+        return getattr(self.target, table)
@@ -0,0 +1,221 @@
+"""
+Pooled HTTP transport for Supabase's REST (PostgREST) API.
+
+One connection pool per process, with explicit connect/read timeouts and
+keep-alive limits, plus bounded exponential-backoff retries:
+
+- idempotent requests (GET/HEAD) are retried on timeouts, dropped
+  connections and 502/503/504 responses
+- any request is retried when the connection could not be established,
+  since nothing was sent
+
+Every attempt is reported as one round trip (see round_trips.py).
+
+Environment (defaults in parentheses):
+SUPABASE_MAX_CONNECTIONS (20), SUPABASE_MAX_KEEPALIVE (10),
+SUPABASE_KEEPALIVE_EXPIRY seconds (30), SUPABASE_CONNECT_TIMEOUT seconds (3),
+SUPABASE_READ_TIMEOUT seconds (10), SUPABASE_RETRIES (2),
+SUPABASE_RETRY_BACKOFF seconds (0.2)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+import httpx
+from postgrest import AsyncPostgrestClient, SyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+from postgrest.utils import AsyncClient, SyncClient
+
+from repositories.round_trips import round_trips
+
+logger = logging.getLogger('exercise_tracker.http')
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+RETRY_STATUSES = (502, 503, 504)
+
+
+@dataclass
+class PoolSettings:
+    max_connections: int = 20
+    max_keepalive: int = 10
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 3.0
+    read_timeout: float = 10.0
+    retries: int = 2
+    retry_backoff: float = 0.2
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_connections=int(os.getenv('SUPABASE_MAX_CONNECTIONS', cls.max_connections)),
+            max_keepalive=int(os.getenv('SUPABASE_MAX_KEEPALIVE', cls.max_keepalive)),
+            keepalive_expiry=float(os.getenv('SUPABASE_KEEPALIVE_EXPIRY', cls.keepalive_expiry)),
+            connect_timeout=float(os.getenv('SUPABASE_CONNECT_TIMEOUT', cls.connect_timeout)),
+            read_timeout=float(os.getenv('SUPABASE_READ_TIMEOUT', cls.read_timeout)),
+            retries=int(os.getenv('SUPABASE_RETRIES', cls.retries)),
+            retry_backoff=float(os.getenv('SUPABASE_RETRY_BACKOFF', cls.retry_backoff))
+        )
+
+    def timeout(self):
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.read_timeout,
+            pool=self.connect_timeout
+        )
+
+    def limits(self):
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+
+class RetryPolicy:
+    """Decides whether a failed attempt is retried, and after how long"""
+
+    def __init__(self, retries=2, backoff=0.2):
+        self.retries = retries
+        self.backoff = backoff
+
+    def retry_reason(self, request, attempt, response=None, error=None):
+        """Return why the attempt should be retried, or None to give up"""
+        if attempt >= self.retries:
+            return None
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+            return error
+        if request.method not in IDEMPOTENT_METHODS:
+            return None
+        if isinstance(error, (httpx.ReadTimeout, httpx.RemoteProtocolError, httpx.ReadError)):
+            return error
+        if response is not None and response.status_code in RETRY_STATUSES:
+            return f'HTTP {response.status_code}'
+        return None
+
+    def delay(self, request, attempt, reason):
+        delay = self.backoff * (2 ** attempt)
+        logger.warning("Retrying %s %s in %.2fs (attempt %d): %s",
+                       request.method, request.url.path, delay, attempt + 1, reason)
+        return delay
+
+
+RETRYABLE_ERRORS = (
+    httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout,
+    httpx.ReadTimeout, httpx.RemoteProtocolError, httpx.ReadError
+)
+
+
+class RetryTransport(httpx.BaseTransport):
+    def __init__(self, transport, retries=2, backoff=0.2):
+        self.transport = transport
+        self.policy = RetryPolicy(retries, backoff)
+
+    def handle_request(self, request):
+        attempt = 0
+        while True:
+            try:
+                with round_trips.track('supabase'):
+                    response = self.transport.handle_request(request)
+            except RETRYABLE_ERRORS as e:
+                reason = self.policy.retry_reason(request, attempt, error=e)
+                if reason is None:
+                    raise
+            else:
+                reason = self.policy.retry_reason(request, attempt, response=response)
+                if reason is None:
+                    return response
+                response.close()
+
+            time.sleep(self.policy.delay(request, attempt, reason))
+            attempt += 1
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport, retries=2, backoff=0.2):
+        self.transport = transport
+        self.policy = RetryPolicy(retries, backoff)
+
+    async def handle_async_request(self, request):
+        attempt = 0
+        while True:
+            try:
+                async with round_trips.track_async('supabase'):
+                    response = await self.transport.handle_async_request(request)
+            except RETRYABLE_ERRORS as e:
+                reason = self.policy.retry_reason(request, attempt, error=e)
+                if reason is None:
+                    raise
+            else:
+                reason = self.policy.retry_reason(request, attempt, response=response)
+                if reason is None:
+                    return response
+                await response.aclose()
+
+            await asyncio.sleep(self.policy.delay(request, attempt, reason))
+            attempt += 1
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class PooledPostgrestClient(SyncPostgrestClient):
+    """PostgREST client whose session uses the given transport"""
+
+    def __init__(self, base_url, *, transport, **kwargs):
+        self._transport = transport
+        super().__init__(base_url, **kwargs)
+
+    def create_session(self, base_url, headers, timeout):
+        return SyncClient(base_url=base_url, headers=headers, timeout=timeout, transport=self._transport)
+
+
+class PooledAsyncPostgrestClient(AsyncPostgrestClient):
+    """Async PostgREST client whose session uses the given transport"""
+
+    def __init__(self, base_url, *, transport, **kwargs):
+        self._transport = transport
+        super().__init__(base_url, **kwargs)
+
+    def create_session(self, base_url, headers, timeout):
+        return AsyncClient(base_url=base_url, headers=headers, timeout=timeout, transport=self._transport)
+
+
+def client_options(url, key, settings):
+    return {
+        'base_url': f"{url.rstrip('/')}/rest/v1",
+        'headers': {
+            **DEFAULT_POSTGREST_CLIENT_HEADERS,
+            'apikey': key,
+            'Authorization': f'Bearer {key}'
+        },
+        'timeout': settings.timeout()
+    }
+
+
+def create_postgrest_client(url, key, settings=None):
+    """Create a PostgREST client for a Supabase project using one pooled, retrying transport"""
+    settings = settings or PoolSettings.from_env()
+    transport = RetryTransport(
+        httpx.HTTPTransport(limits=settings.limits()),
+        retries=settings.retries,
+        backoff=settings.retry_backoff
+    )
+    return PooledPostgrestClient(transport=transport, **client_options(url, key, settings))
+
+
+def create_async_postgrest_client(url, key, settings=None):
+    """Async counterpart of create_postgrest_client(), for use on one event loop"""
+    settings = settings or PoolSettings.from_env()
+    transport = AsyncRetryTransport(
+        httpx.AsyncHTTPTransport(limits=settings.limits()),
+        retries=settings.retries,
+        backoff=settings.retry_backoff
+    )
+    return PooledAsyncPostgrestClient(transport=transport, **client_options(url, key, settings))
@@ -0,0 +1,62 @@
+"""
+Counting and timing of backend round trips.
+
+A round trip is one request to the database: one HTTP attempt on the
+Supabase transport (retries count separately), or one statement (or locked
+multi-statement operation, the equivalent of a single Supabase request) on
+SQLite. Backends wrap each round trip in `round_trips.track(backend)` and
+every listener added with `add_listener` is called with
+`(backend, seconds)` when it completes. Setting `latency` (seconds) delays
+every round trip by that much, to simulate the network for benchmarks.
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+
+class RoundTrips:
+    def __init__(self, latency=0):
+        self.latency = latency
+        self._listeners = []
+        self._local = threading.local()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    @contextmanager
+    def track(self, backend):
+        """Time a round trip; round trips nested in it on the same thread are part of it"""
+        if getattr(self._local, 'active', False):
+            yield
+            return
+        self._local.active = True
+        start = time.perf_counter()
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            yield
+        finally:
+            self._local.active = False
+            self._report(backend, time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def track_async(self, backend):
+        start = time.perf_counter()
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            yield
+        finally:
+            self._report(backend, time.perf_counter() - start)
+
+    def _report(self, backend, seconds):
+        for listener in self._listeners:
+            listener(backend, seconds)
+
+
+round_trips = RoundTrips()
@@ -0,0 +1,178 @@
+-- SQLite version of the Supabase schema used by the local backend
+
+create table if not exists admin (
+    id integer primary key autoincrement,
+    username text not null unique,
+    password_hash text not null
+);
+
+create table if not exists class (
+    id integer primary key autoincrement,
+    name text not null,
+    code text,
+    created_at text
+);
+
+create table if not exists student (
+    id integer primary key autoincrement,
+    email text not null,
+    name text not null,
+    class_id integer references class (id)
+);
+
+create table if not exists exercise (
+    id integer primary key autoincrement,
+    name text not null,
+    class_id integer references class (id),
+    qr_token text not null unique,
+    created_at text
+);
+
+create table if not exists completion (
+    id integer primary key autoincrement,
+    student_id integer references student (id),
+    exercise_id integer references exercise (id),
+    student_email text,
+    completed_at text,
+    unique (student_id, exercise_id)
+);
+
+create index if not exists student_class_email_idx on student (class_id, lower(email));
+create index if not exists exercise_class_idx on exercise (class_id);
+create index if not exists completion_exercise_idx on completion (exercise_id);
+
+-- Precomputed completion statistics, kept up to date by triggers
+-- (see migrations/002_class_stats.sql). A completion counts while both its
+-- student and its exercise exist.
+
+create table if not exists class_stats (
+    class_id integer primary key,
+    student_count integer not null default 0,
+    exercise_count integer not null default 0,
+    completion_count integer not null default 0
+);
+
+create table if not exists student_stats (
+    student_id integer primary key,
+    class_id integer not null,
+    completion_count integer not null default 0
+);
+
+create table if not exists exercise_stats (
+    exercise_id integer primary key,
+    class_id integer not null,
+    completion_count integer not null default 0
+);
+
+create index if not exists student_stats_class_idx on student_stats (class_id);
+create index if not exists exercise_stats_class_idx on exercise_stats (class_id);
+create index if not exists completion_student_idx on completion (student_id);
+
+-- Backfill rows that predate the stats tables
+insert or ignore into class_stats (class_id, student_count, exercise_count, completion_count)
+select c.id,
+       (select count(*) from student s where s.class_id = c.id),
+       (select count(*) from exercise e where e.class_id = c.id),
+       (select count(*) from completion co
+            join student s on s.id = co.student_id
+            join exercise e on e.id = co.exercise_id
+        where e.class_id = c.id)
+from class c;
+
+insert or ignore into student_stats (student_id, class_id, completion_count)
+select s.id, s.class_id,
+       (select count(*) from completion co
+            join exercise e on e.id = co.exercise_id
+        where co.student_id = s.id)
+from student s
+where s.class_id is not null;
+
+insert or ignore into exercise_stats (exercise_id, class_id, completion_count)
+select e.id, e.class_id,
+       (select count(*) from completion co
+            join student s on s.id = co.student_id
+        where co.exercise_id = e.id)
+from exercise e
+where e.class_id is not null;
+
+create trigger if not exists class_stats_class_insert
+after insert on class
+begin
+    insert or ignore into class_stats (class_id) values (new.id);
+end;
+
+create trigger if not exists class_stats_class_delete
+after delete on class
+begin
+    delete from class_stats where class_id = old.id;
+end;
+
+create trigger if not exists class_stats_student_insert
+after insert on student
+begin
+    insert or ignore into student_stats (student_id, class_id) values (new.id, new.class_id);
+    update class_stats set student_count = student_count + 1 where class_id = new.class_id;
+end;
+
+create trigger if not exists class_stats_student_delete
+before delete on student
+when exists (select 1 from student_stats where student_id = old.id)
+begin
+    update exercise_stats
+    set completion_count = completion_count - 1
+    where exercise_id in (select exercise_id from completion where student_id = old.id);
+
+    update class_stats
+    set student_count = student_count - 1,
+        completion_count = completion_count - (select completion_count from student_stats where student_id = old.id)
+    where class_id = old.class_id;
+
+    delete from student_stats where student_id = old.id;
+end;
+
+create trigger if not exists class_stats_exercise_insert
+after insert on exercise
+begin
+    insert or ignore into exercise_stats (exercise_id, class_id) values (new.id, new.class_id);
+    update class_stats set exercise_count = exercise_count + 1 where class_id = new.class_id;
+end;
+
+create trigger if not exists class_stats_exercise_delete
+before delete on exercise
+when exists (select 1 from exercise_stats where exercise_id = old.id)
+begin
+    update student_stats
+    set completion_count = completion_count - 1
+    where student_id in (select student_id from completion where exercise_id = old.id);
+
+    update class_stats
+    set exercise_count = exercise_count - 1,
+        completion_count = completion_count - (select completion_count from exercise_stats where exercise_id = old.id)
+    where class_id = old.class_id;
+
+    delete from exercise_stats where exercise_id = old.id;
+end;
+
+create trigger if not exists class_stats_completion_insert
+after insert on completion
+when exists (select 1 from student_stats where student_id = new.student_id)
+ and exists (select 1 from exercise_stats where exercise_id = new.exercise_id)
+begin
+    update student_stats set completion_count = completion_count + 1 where student_id = new.student_id;
+    update exercise_stats set completion_count = completion_count + 1 where exercise_id = new.exercise_id;
+    update class_stats
+    set completion_count = completion_count + 1
+    where class_id = (select class_id from exercise_stats where exercise_id = new.exercise_id);
+end;
+
+create trigger if not exists class_stats_completion_delete
+after delete on completion
+when exists (select 1 from student_stats where student_id = old.student_id)
+ and exists (select 1 from exercise_stats where exercise_id = old.exercise_id)
+begin
+    update student_stats set completion_count = completion_count - 1 where student_id = old.student_id;
+    update exercise_stats set completion_count = completion_count - 1 where exercise_id = old.exercise_id;
+    update class_stats
+    set completion_count = completion_count - 1
+    where class_id = (select class_id from exercise_stats where exercise_id = old.exercise_id);
+end;
@@ -0,0 +1,361 @@
+"""
+Embedded SQLite implementation of the repositories.
+
+Uses the same tables and columns as the Supabase schema (see schema.sql),
+so the app can run locally without a Supabase project and benchmarks have
+a reproducible backend. A single connection is shared between threads and
+serialized with a lock. Each statement is reported as a round trip (see
+round_trips.py); operations that take several statements under
+`round_trip()` are reported as one, like the single Supabase request they
+stand in for.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from repositories.base import (
+    AdminRepository, ClassRepository, StudentRepository,
+    ExerciseRepository, CompletionRepository, Repository
+)
+from repositories.round_trips import round_trips
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'schema.sql')
+
+
+class SQLiteDatabase:
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        if path != ':memory:':
+            self.connection.execute('pragma journal_mode = wal')
+        with open(SCHEMA_PATH) as schema:
+            self.connection.executescript(schema.read())
+
+    @contextmanager
+    def round_trip(self):
+        """Hold the connection for one round trip; statements run inside it aren't counted separately"""
+        with round_trips.track('sqlite'), self.lock:
+            yield
+
+    def query(self, sql, params=()):
+        with self.round_trip():
+            return [dict(row) for row in self.connection.execute(sql, params).fetchall()]
+
+    def query_one(self, sql, params=()):
+        rows = self.query(sql, params)
+        return rows[0] if rows else None
+
+    def execute(self, sql, params=()):
+        with self.round_trip(), self.connection:
+            return self.connection.execute(sql, params)
+
+    def insert(self, table, values):
+        """Insert one row and return it as stored"""
+        columns = ', '.join(values)
+        placeholders = ', '.join('?' for _ in values)
+        with self.round_trip():
+            with self.connection:
+                cursor = self.connection.execute(
+                    f'insert into {table} ({columns}) values ({placeholders})', tuple(values.values())
+                )
+            return self.query_one(f'select * from {table} where id = ?', (cursor.lastrowid,))
+
+
+def page_bounds(after, limit):
+    """(after, limit) query parameters for keyset paging; -1 lifts the limit"""
+    return (after if after is not None else 0, limit if limit is not None else -1)
+
+
+class SQLiteAdminRepository(AdminRepository):
+    def __init__(self, db):
+        self.db = db
+
+    def get_by_username(self, username):
+        return self.db.query_one('select * from admin where username = ?', (username,))
+
+    def create(self, username, password_hash):
+        return self.db.insert('admin', {'username': username, 'password_hash': password_hash})
+
+    def update_password(self, admin_id, password_hash):
+        self.db.execute('update admin set password_hash = ? where id = ?', (password_hash, admin_id))
+
+
+class SQLiteClassRepository(ClassRepository):
+    def __init__(self, db):
+        self.db = db
+
+    SUMMARY_SQL = '''
+        select c.id, c.name, c.code, count(s.id) as student_count
+        from class c left join student s on s.class_id = c.id
+    '''
+
+    def list_with_student_counts(self):
+        return self.db.query(self.SUMMARY_SQL + ' group by c.id order by c.id')
+
+    def get_with_student_count(self, class_id):
+        return self.db.query_one(self.SUMMARY_SQL + ' where c.id = ? group by c.id', (class_id,))
+
+    def get(self, class_id):
+        return self.db.query_one('select id, name, code from class where id = ?', (class_id,))
+
+    def create(self, name, code, created_at):
+        return self.db.insert('class', {'name': name, 'code': code, 'created_at': created_at})
+
+    def update(self, class_id, name, code):
+        self.db.execute('update class set name = ?, code = ? where id = ?', (name, code, class_id))
+        return self.db.query_one('select * from class where id = ?', (class_id,))
+
+    def stats(self, class_id):
+        # Maintained by the class_stats triggers in schema.sql
+        summary = self.db.query_one(
+            'select student_count, exercise_count, completion_count from class_stats where class_id = ?', (class_id,)
+        )
+        if not summary:
+            return None
+        summary['students'] = self.db.query('''
+            select s.id, s.name, ss.completion_count
+            from student_stats ss join student s on s.id = ss.student_id
+            where ss.class_id = ?
+            order by s.id
+        ''', (class_id,))
+        summary['exercises'] = self.db.query('''
+            select e.id, e.name, es.completion_count
+            from exercise_stats es join exercise e on e.id = es.exercise_id
+            where es.class_id = ?
+            order by e.id
+        ''', (class_id,))
+        return summary
+
+    def delete(self, class_id):
+        with self.db.round_trip():
+            exercise_ids = [e['id'] for e in self.db.query('select id from exercise where class_id = ?', (class_id,))]
+            # One transaction, same effect as the ON DELETE CASCADE keys in
+            # migrations/003_cascade_deletes.sql
+            with self.db.connection:
+                self.db.connection.execute('''
+                    delete from completion
+                    where exercise_id in (select id from exercise where class_id = ?)
+                       or student_id in (select id from student where class_id = ?)
+                ''', (class_id, class_id))
+                self.db.connection.execute('delete from student where class_id = ?', (class_id,))
+                self.db.connection.execute('delete from exercise where class_id = ?', (class_id,))
+                self.db.connection.execute('delete from class where id = ?', (class_id,))
+        return exercise_ids
+
+
+class SQLiteStudentRepository(StudentRepository):
+    def __init__(self, db):
+        self.db = db
+
+    def list_for_class(self, class_id, after=None, limit=None):
+        return self.db.query(
+            'select id, name, email from student where class_id = ? and id > ? order by id limit ?',
+            (class_id, *page_bounds(after, limit))
+        )
+
+    def roster(self, class_id):
+        return self.db.query('select id, name, email from student where class_id = ? order by id', (class_id,))
+
+    def create(self, class_id, name, email):
+        return self.db.insert('student', {'email': email, 'name': name, 'class_id': class_id})
+
+    def create_many(self, class_id, students):
+        with self.db.round_trip():
+            with self.db.connection:
+                ids = [
+                    self.db.connection.execute(
+                        'insert into student (email, name, class_id) values (?, ?, ?)',
+                        (s['email'], s['name'], class_id)
+                    ).lastrowid
+                    for s in students
+                ]
+            if not ids:
+                return []
+            placeholders = ', '.join('?' for _ in ids)
+            return self.db.query(f'select * from student where id in ({placeholders}) order by id', ids)
+
+    def delete(self, student_id):
+        with self.db.round_trip():
+            student = self.db.query_one('select * from student where id = ?', (student_id,))
+            with self.db.connection:
+                self.db.connection.execute('delete from completion where student_id = ?', (student_id,))
+                self.db.connection.execute('delete from student where id = ?', (student_id,))
+        return student
+
+    def purge_orphans(self, batch_size):
+        return self.db.execute('''
+            delete from student
+            where id in (
+                select s.id from student s
+                where not exists (select 1 from class c where c.id = s.class_id)
+                limit ?
+            )
+        ''', (batch_size,)).rowcount
+
+
+class SQLiteExerciseRepository(ExerciseRepository):
+    def __init__(self, db):
+        self.db = db
+
+    def list_with_completion_counts(self, class_id, after=None, limit=None):
+        return self.db.query('''
+            select e.id, e.name, e.created_at, count(c.id) as completion_count
+            from exercise e left join completion c on c.exercise_id = e.id
+            where e.class_id = ? and e.id > ?
+            group by e.id
+            order by e.id
+            limit ?
+        ''', (class_id, *page_bounds(after, limit)))
+
+    def list_for_class(self, class_id):
+        return self.db.query('select id, name, qr_token from exercise where class_id = ? order by id', (class_id,))
+
+    def get(self, exercise_id):
+        return self.db.query_one('select * from exercise where id = ?', (exercise_id,))
+
+    def get_by_token(self, token):
+        exercise = self.db.query_one(
+            'select id, name, class_id, qr_token from exercise where qr_token = ?', (token,)
+        )
+        if not exercise:
+            return None, None
+        class_info = self.db.query_one('select id, name, code from class where id = ?', (exercise['class_id'],))
+        return exercise, class_info
+
+    def create(self, class_id, name, qr_token, created_at):
+        return self.db.insert('exercise', {
+            'name': name,
+            'class_id': class_id,
+            'qr_token': qr_token,
+            'created_at': created_at
+        })
+
+    def delete(self, exercise_id):
+        with self.db.round_trip():
+            exercise = self.db.query_one('select * from exercise where id = ?', (exercise_id,))
+            with self.db.connection:
+                self.db.connection.execute('delete from completion where exercise_id = ?', (exercise_id,))
+                self.db.connection.execute('delete from exercise where id = ?', (exercise_id,))
+        return exercise
+
+    def purge_orphans(self, batch_size):
+        return self.db.execute('''
+            delete from exercise
+            where id in (
+                select e.id from exercise e
+                where not exists (select 1 from class c where c.id = e.class_id)
+                limit ?
+            )
+        ''', (batch_size,)).rowcount
+
+
+class SQLiteCompletionRepository(CompletionRepository):
+    def __init__(self, db):
+        self.db = db
+
+    def list_for_exercise(self, exercise_id, after=None, limit=None):
+        return self.db.query('''
+            select c.id, c.student_email, coalesce(s.name, 'Unknown') as student_name, c.completed_at
+            from completion c left join student s on s.id = c.student_id
+            where c.exercise_id = ? and c.id > ?
+            order by c.id
+            limit ?
+        ''', (exercise_id, *page_bounds(after, limit)))
+
+    def student_ids_for_exercise(self, exercise_id):
+        rows = self.db.query(
+            'select student_id from completion where exercise_id = ? and student_id is not null',
+            (exercise_id,)
+        )
+        return [r['student_id'] for r in rows]
+
+    def iter_for_class(self, class_id, page_size):
+        # Keyset pages on (student_id, id); ids start at 1
+        last_student_id, last_id = 0, 0
+        while True:
+            rows = self.db.query('''
+                select c.id, c.student_id, c.exercise_id, c.completed_at
+                from completion c join exercise e on e.id = c.exercise_id
+                where e.class_id = ? and c.student_id is not null
+                  and (c.student_id, c.id) > (?, ?)
+                order by c.student_id, c.id
+                limit ?
+            ''', (class_id, last_student_id, last_id, page_size))
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_student_id, last_id = rows[-1]['student_id'], rows[-1]['id']
+
+    def record(self, token, email):
+        # Same steps and result shape as the record_completion database function
+        with self.db.round_trip():
+            exercise = self.db.query_one('select * from exercise where qr_token = ?', (token,))
+            if not exercise:
+                return {'status': 'exercise_not_found'}
+
+            student = self.db.query_one(
+                'select * from student where class_id = ? and lower(email) = lower(?) order by id limit 1',
+                (exercise['class_id'], email)
+            )
+            if not student:
+                return {'status': 'student_not_found', 'exercise_id': exercise['id'], 'class_id': exercise['class_id']}
+
+            completed_at = datetime.utcnow().isoformat()
+            with self.db.connection:
+                cursor = self.db.connection.execute('''
+                    insert or ignore into completion (student_id, exercise_id, student_email, completed_at)
+                    values (?, ?, ?, ?)
+                ''', (student['id'], exercise['id'], email, completed_at))
+
+        recorded = cursor.rowcount == 1
+        return {
+            'status': 'recorded' if recorded else 'already_completed',
+            'completion_id': cursor.lastrowid if recorded else None,
+            'completed_at': completed_at if recorded else None,
+            'exercise_id': exercise['id'],
+            'exercise_name': exercise['name'],
+            'class_id': exercise['class_id'],
+            'student_id': student['id'],
+            'student_name': student['name']
+        }
+
+    def purge_orphans(self, batch_size):
+        return self.db.execute('''
+            delete from completion
+            where id in (
+                select co.id from completion co
+                where not exists (select 1 from student s where s.id = co.student_id)
+                   or not exists (select 1 from exercise e where e.id = co.exercise_id)
+                limit ?
+            )
+        ''', (batch_size,)).rowcount
+
+    def insert_many(self, rows):
+        with self.db.round_trip(), self.db.connection:
+            self.db.connection.executemany('''
+                insert or ignore into completion (student_id, exercise_id, student_email, completed_at)
+                values (:student_id, :exercise_id, :student_email, :completed_at)
+            ''', rows)
+
+
+class SQLiteRepository(Repository):
+    name = 'sqlite'
+
+    def __init__(self, db):
+        self.db = db
+        super().__init__(
+            admins=SQLiteAdminRepository(db),
+            classes=SQLiteClassRepository(db),
+            students=SQLiteStudentRepository(db),
+            exercises=SQLiteExerciseRepository(db),
+            completions=SQLiteCompletionRepository(db)
+        )
+
+
+def create_sqlite_repository(path=':memory:'):
+    return SQLiteRepository(SQLiteDatabase(path))
@@ -0,0 +1,404 @@
+"""
+Supabase (PostgREST) implementation of the repositories.
+
+`client` is anything with the PostgREST `table()` / `rpc()` API: the
+pooled client from http_pool.py, or a `supabase.Client`. The
+SupabaseAsync* classes cover the student completion routes on an async
+client (see repositories/aio.py).
+"""
+
+from repositories.base import (
+    AdminRepository, ClassRepository, StudentRepository,
+    ExerciseRepository, CompletionRepository, Repository
+)
+
+# Class rows with their student count embedded by PostgREST (grouped count
+# over the student.class_id foreign key), so one request covers any number
+# of classes.
+CLASS_SUMMARY_COLUMNS = 'id,name,code,student(count)'
+
+# Exercise rows with their completion count embedded the same way
+EXERCISE_SUMMARY_COLUMNS = 'id,name,created_at,completion(count)'
+
+# Class-wide counts from the class_stats summary table
+CLASS_STATS_COLUMNS = 'student_count,exercise_count,completion_count'
+
+# Student rows as returned by the admin API
+STUDENT_COLUMNS = 'id,name,email'
+
+# Exercise looked up by QR token, with its class embedded
+EXERCISE_TOKEN_COLUMNS = 'id,name,class_id,qr_token,class(id,name,code)'
+
+# Completion rows with the student's name embedded over completion.student_id
+COMPLETION_COLUMNS = 'id,student_email,completed_at,student(name)'
+
+# Rows per request when reading a whole table slice (PostgREST's default max-rows)
+READ_PAGE_SIZE = 1000
+
+
+def embedded_count(row, table):
+    """Read a PostgREST embedded `table(count)` aggregate from a row"""
+    embedded = row.get(table) or []
+    return embedded[0]['count'] if embedded else 0
+
+
+def class_summary(c):
+    return {
+        'id': c['id'],
+        'name': c['name'],
+        'code': c['code'],
+        'student_count': embedded_count(c, 'student')
+    }
+
+
+def exercise_summary(e):
+    return {
+        'id': e['id'],
+        'name': e['name'],
+        'created_at': e['created_at'],
+        'completion_count': embedded_count(e, 'completion')
+    }
+
+
+def completion_summary(c):
+    student = c.get('student')
+    return {
+        'id': c['id'],
+        'student_email': c['student_email'],
+        'student_name': student['name'] if student else 'Unknown',
+        'completed_at': c['completed_at']
+    }
+
+
+def first(response):
+    return response.data[0] if response.data else None
+
+
+def page(query, after, limit):
+    """Apply keyset paging (id > after, ordered by id) to a select query"""
+    if after is not None:
+        query = query.gt('id', after)
+    query = query.order('id')
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def read_all(make_query, after=None):
+    """Read every row of a select by keyset pages of READ_PAGE_SIZE, so
+    PostgREST's max-rows cap can't truncate the result, starting after the
+    id `after`. `make_query` returns a fresh select (which must include id)
+    for each page."""
+    rows = []
+    while True:
+        batch = page(make_query(), after, READ_PAGE_SIZE).execute().data or []
+        rows.extend(batch)
+        if len(batch) < READ_PAGE_SIZE:
+            return rows
+        after = batch[-1]['id']
+
+
+async def read_all_async(make_query, after=None):
+    """read_all for the async client"""
+    rows = []
+    while True:
+        batch = (await page(make_query(), after, READ_PAGE_SIZE).execute()).data or []
+        rows.extend(batch)
+        if len(batch) < READ_PAGE_SIZE:
+            return rows
+        after = batch[-1]['id']
+
+
+def after_student_completion(query, student_id, completion_id):
+    """Keep rows with (student_id, id) > (student_id, completion_id).
+
+    PostgREST has no row comparison, so this is the equivalent `or` filter
+    (this postgrest-py version has no or_() builder).
+    """
+    query.params = query.params.add(
+        'or', f'(student_id.gt.{student_id},and(student_id.eq.{student_id},id.gt.{completion_id}))'
+    )
+    return query
+
+
+def purge_orphans(client, table, batch_size):
+    response = client.rpc('purge_orphans', {'p_table': table, 'p_batch_size': batch_size}).execute()
+    return response.data or 0
+
+
+def split_class(exercise):
+    """Split an exercise row with an embedded class into (exercise, class_info)"""
+    if not exercise:
+        return None, None
+    class_info = exercise.pop('class', None)
+    return exercise, class_info
+
+
+class SupabaseAdminRepository(AdminRepository):
+    def __init__(self, client):
+        self.client = client
+
+    def get_by_username(self, username):
+        return first(self.client.table('admin').select('*').eq('username', username).execute())
+
+    def create(self, username, password_hash):
+        return first(self.client.table('admin').insert({
+            'username': username,
+            'password_hash': password_hash
+        }).execute())
+
+    def update_password(self, admin_id, password_hash):
+        self.client.table('admin').update({'password_hash': password_hash}).eq('id', admin_id).execute()
+
+
+class SupabaseClassRepository(ClassRepository):
+    def __init__(self, client):
+        self.client = client
+
+    def list_with_student_counts(self):
+        response = self.client.table('class').select(CLASS_SUMMARY_COLUMNS).execute()
+        return [class_summary(c) for c in response.data or []]
+
+    def get_with_student_count(self, class_id):
+        c = first(self.client.table('class').select(CLASS_SUMMARY_COLUMNS).eq('id', class_id).execute())
+        return class_summary(c) if c else None
+
+    def get(self, class_id):
+        return first(self.client.table('class').select('id,name,code').eq('id', class_id).execute())
+
+    def create(self, name, code, created_at):
+        return first(self.client.table('class').insert({
+            'name': name,
+            'code': code,
+            'created_at': created_at
+        }).execute())
+
+    def update(self, class_id, name, code):
+        return first(self.client.table('class').update({
+            'name': name,
+            'code': code
+        }).eq('id', class_id).execute())
+
+    def stats(self, class_id):
+        # Maintained by the triggers in migrations/002_class_stats.sql
+        summary = first(self.client.table('class_stats').select(CLASS_STATS_COLUMNS).eq('class_id', class_id).execute())
+        if not summary:
+            return None
+        students = (self.client.table('student_stats').select('student_id,completion_count,student(name)')
+                    .eq('class_id', class_id).order('student_id').execute())
+        exercises = (self.client.table('exercise_stats').select('exercise_id,completion_count,exercise(name)')
+                     .eq('class_id', class_id).order('exercise_id').execute())
+        summary['students'] = [
+            {'id': s['student_id'], 'name': (s.get('student') or {}).get('name'), 'completion_count': s['completion_count']}
+            for s in students.data or []
+        ]
+        summary['exercises'] = [
+            {'id': e['exercise_id'], 'name': (e.get('exercise') or {}).get('name'), 'completion_count': e['completion_count']}
+            for e in exercises.data or []
+        ]
+        return summary
+
+    def delete(self, class_id):
+        # Students, exercises and completions go with it through the cascading
+        # foreign keys (migrations/003_cascade_deletes.sql)
+        return self.client.rpc('delete_class', {'p_class_id': class_id}).execute().data or []
+
+
+class SupabaseStudentRepository(StudentRepository):
+    def __init__(self, client):
+        self.client = client
+
+    def list_for_class(self, class_id, after=None, limit=None):
+        query = self.client.table('student').select(STUDENT_COLUMNS).eq('class_id', class_id)
+        return page(query, after, limit).execute().data or []
+
+    def roster(self, class_id):
+        return read_all(lambda: self.client.table('student').select(STUDENT_COLUMNS).eq('class_id', class_id))
+
+    def create(self, class_id, name, email):
+        return first(self.client.table('student').insert({
+            'email': email,
+            'name': name,
+            'class_id': class_id
+        }).execute())
+
+    def create_many(self, class_id, students):
+        response = self.client.table('student').insert([
+            {'email': s['email'], 'name': s['name'], 'class_id': class_id}
+            for s in students
+        ]).execute()
+        return response.data or []
+
+    def delete(self, student_id):
+        return first(self.client.table('student').delete().eq('id', student_id).execute())
+
+    def purge_orphans(self, batch_size):
+        return purge_orphans(self.client, 'student', batch_size)
+
+
+class SupabaseExerciseRepository(ExerciseRepository):
+    def __init__(self, client):
+        self.client = client
+
+    def list_with_completion_counts(self, class_id, after=None, limit=None):
+        query = self.client.table('exercise').select(EXERCISE_SUMMARY_COLUMNS).eq('class_id', class_id)
+        response = page(query, after, limit).execute()
+        return [exercise_summary(e) for e in response.data or []]
+
+    def list_for_class(self, class_id):
+        return read_all(lambda: self.client.table('exercise').select('id,name,qr_token').eq('class_id', class_id))
+
+    def get(self, exercise_id):
+        return first(self.client.table('exercise').select('*').eq('id', exercise_id).execute())
+
+    def get_by_token(self, token):
+        return split_class(first(
+            self.client.table('exercise').select(EXERCISE_TOKEN_COLUMNS).eq('qr_token', token).execute()
+        ))
+
+    def create(self, class_id, name, qr_token, created_at):
+        return first(self.client.table('exercise').insert({
+            'name': name,
+            'class_id': class_id,
+            'qr_token': qr_token,
+            'created_at': created_at
+        }).execute())
+
+    def delete(self, exercise_id):
+        # Completions cascade (migrations/003_cascade_deletes.sql)
+        return first(self.client.table('exercise').delete().eq('id', exercise_id).execute())
+
+    def purge_orphans(self, batch_size):
+        return purge_orphans(self.client, 'exercise', batch_size)
+
+
+class SupabaseCompletionRepository(CompletionRepository):
+    def __init__(self, client):
+        self.client = client
+
+    def list_for_exercise(self, exercise_id, after=None, limit=None):
+        def query():
+            return self.client.table('completion').select(COMPLETION_COLUMNS).eq('exercise_id', exercise_id)
+
+        # Without a limit the caller wants every row, which may take several pages
+        if limit is None:
+            rows = read_all(query, after)
+        else:
+            rows = page(query(), after, limit).execute().data or []
+        return [completion_summary(c) for c in rows]
+
+    def student_ids_for_exercise(self, exercise_id):
+        rows = read_all(lambda: self.client.table('completion').select('id,student_id').eq('exercise_id', exercise_id))
+        return [r['student_id'] for r in rows if r['student_id'] is not None]
+
+    def iter_for_class(self, class_id, page_size):
+        # Keyset pages on (student_id, id), so rows deleted during an export
+        # can't shift later pages the way an offset would
+        last = None
+        while True:
+            query = (self.client.table('completion')
+                     .select('id,student_id,exercise_id,completed_at,exercise!inner(class_id)')
+                     .eq('exercise.class_id', class_id)
+                     .not_.is_('student_id', 'null'))
+            if last is not None:
+                query = after_student_completion(query, last['student_id'], last['id'])
+            rows = query.order('student_id,id').limit(page_size).execute().data or []
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last = rows[-1]
+
+    def record(self, token, email):
+        response = self.client.rpc('record_completion', {'p_token': token, 'p_email': email}).execute()
+        return response.data or {}
+
+    def purge_orphans(self, batch_size):
+        return purge_orphans(self.client, 'completion', batch_size)
+
+    def insert_many(self, rows):
+        # Rows already recorded are skipped via the (student_id, exercise_id)
+        # unique constraint from migrations/001_record_completion.sql
+        self.client.table('completion').upsert(
+            rows, on_conflict='student_id,exercise_id', ignore_duplicates=True, returning='minimal'
+        ).execute()
+
+
+class SupabaseRepository(Repository):
+    name = 'supabase'
+
+    def __init__(self, client):
+        self.client = client
+        super().__init__(
+            admins=SupabaseAdminRepository(client),
+            classes=SupabaseClassRepository(client),
+            students=SupabaseStudentRepository(client),
+            exercises=SupabaseExerciseRepository(client),
+            completions=SupabaseCompletionRepository(client)
+        )
+
+
+class SupabaseAsyncStudentRepository:
+    def __init__(self, client):
+        self.client = client
+
+    async def roster(self, class_id):
+        return await read_all_async(
+            lambda: self.client.table('student').select(STUDENT_COLUMNS).eq('class_id', class_id)
+        )
+
+
+class SupabaseAsyncExerciseRepository:
+    def __init__(self, client):
+        self.client = client
+
+    async def get_by_token(self, token):
+        return split_class(first(
+            await self.client.table('exercise').select(EXERCISE_TOKEN_COLUMNS).eq('qr_token', token).execute()
+        ))
+
+
+class SupabaseAsyncCompletionRepository:
+    def __init__(self, client):
+        self.client = client
+
+    async def list_for_exercise(self, exercise_id, after=None, limit=None):
+        def query():
+            return self.client.table('completion').select(COMPLETION_COLUMNS).eq('exercise_id', exercise_id)
+
+        if limit is None:
+            rows = await read_all_async(query, after)
+        else:
+            rows = (await page(query(), after, limit).execute()).data or []
+        return [completion_summary(c) for c in rows]
+
+    async def student_ids_for_exercise(self, exercise_id):
+        rows = await read_all_async(
+            lambda: self.client.table('completion').select('id,student_id').eq('exercise_id', exercise_id)
+        )
+        return [r['student_id'] for r in rows if r['student_id'] is not None]
+
+    async def record(self, token, email):
+        response = await self.client.rpc('record_completion', {'p_token': token, 'p_email': email}).execute()
+        return response.data or {}
+
+
+class SupabaseAsyncRepository:
+    name = 'supabase'
+
+    def __init__(self, client):
+        self.client = client
+        self.students = SupabaseAsyncStudentRepository(client)
+        self.exercises = SupabaseAsyncExerciseRepository(client)
+        self.completions = SupabaseAsyncCompletionRepository(client)
+
+
+def create_supabase_repository(url, key):
+    # Talks to the project's REST API directly through one pooled transport
+    # with timeouts and retries (see http_pool.py)
+    from repositories.http_pool import create_postgrest_client
+    return SupabaseRepository(create_postgrest_client(url, key))
+
+
+def create_supabase_async_repository(url, key):
+    from repositories.http_pool import create_async_postgrest_client
+    return SupabaseAsyncRepository(create_async_postgrest_client(url, key))
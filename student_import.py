@@ -0,0 +1,82 @@
+"""
+Parsing and validation for bulk student roster uploads.
+
+Rows come either from an uploaded CSV file (header row, then
+"Last, First,email@example.com" lines) or from a JSON array of
+{"name": ..., "email": ...} objects.
+"""
+
+
+def parse_student_csv(text):
+    """Parse roster CSV text into (rows, errors).
+
+    Each row is {'line': n, 'name': ..., 'email': ...}. Names may contain
+    unquoted commas, so the email is always taken from the last field and
+    "Last, First" names are turned into "First Last".
+    """
+    rows = []
+    errors = []
+    lines = [line for line in text.splitlines() if line.strip()]
+
+    # Skip header row
+    for line_number, line in enumerate(lines[1:], start=2):
+        name_field, _, email = line.strip().rpartition(',')
+        email = email.strip().strip('"\'')
+        name_field = name_field.strip().strip('"\'')
+
+        if '@' not in email:
+            errors.append({'line': line_number, 'error': 'Could not find email address'})
+            continue
+
+        if ',' in name_field:
+            name_parts = [part.strip() for part in name_field.split(',')]
+            name = f"{' '.join(name_parts[1:])} {name_parts[0]}".strip()
+        else:
+            name = name_field
+
+        rows.append({'line': line_number, 'name': name, 'email': email})
+
+    return rows, errors
+
+
+def rows_from_json(items):
+    """Turn a JSON array of {'name', 'email'} objects into (rows, errors)"""
+    rows = []
+    errors = []
+
+    for index, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            errors.append({'line': index, 'error': 'Expected an object with name and email'})
+            continue
+        rows.append({
+            'line': index,
+            'name': str(item.get('name') or '').strip(),
+            'email': str(item.get('email') or '').strip()
+        })
+
+    return rows, errors
+
+
+def validate_student_rows(rows, existing_emails):
+    """Split rows into (students to insert, errors).
+
+    Emails are compared case-insensitively against the class roster and
+    against earlier rows of the same upload.
+    """
+    students = []
+    errors = []
+    seen = set(existing_emails)
+
+    for row in rows:
+        email_key = row['email'].lower()
+        if not row['name'] or not row['email']:
+            errors.append({'line': row['line'], 'email': row['email'], 'error': 'Missing name or email'})
+        elif '@' not in row['email']:
+            errors.append({'line': row['line'], 'email': row['email'], 'error': 'Invalid email format'})
+        elif email_key in seen:
+            errors.append({'line': row['line'], 'email': row['email'], 'error': 'Duplicate email'})
+        else:
+            seen.add(email_key)
+            students.append(row)
+
+    return students, errors
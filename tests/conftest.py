@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The app reads its configuration at import time
+os.environ.setdefault('DATA_BACKEND', 'sqlite')
+os.environ.setdefault('SQLITE_PATH', ':memory:')
+os.environ.setdefault('FLASK_ENV', 'production')
+os.environ.setdefault('TRUSTED_PROXY_HOPS', '1')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
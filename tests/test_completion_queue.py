@@ -0,0 +1,153 @@
+import pytest
+
+from completion_queue import CompletionWriter
+
+
+class FakeTable:
+    """Collects written rows; rows for exercises in `bad_exercises` fail"""
+
+    def __init__(self, bad_exercises=()):
+        self.rows = []
+        self.calls = 0
+        self.bad_exercises = set(bad_exercises)
+
+    def write_batch(self, rows):
+        self.calls += 1
+        if any(row['exercise_id'] in self.bad_exercises for row in rows):
+            raise RuntimeError('foreign key violation')
+        self.rows.extend(rows)
+
+
+def completion(student_id, exercise_id=1):
+    return {'student_id': student_id, 'exercise_id': exercise_id, 'student_email': f's{student_id}@example.com'}
+
+
+@pytest.fixture
+def table():
+    return FakeTable()
+
+
+@pytest.fixture
+def make_writer():
+    writers = []
+
+    def make(write_batch, **kwargs):
+        # A long interval so the background thread only flushes when stopped
+        kwargs.setdefault('flush_interval', 60)
+        writer = CompletionWriter(write_batch, **kwargs)
+        writers.append(writer)
+        return writer
+
+    yield make
+    for writer in writers:
+        writer.stop()
+
+
+def test_flush_writes_in_batches(table, make_writer):
+    writer = make_writer(table.write_batch)
+    for student_id in range(7):
+        writer.submit(completion(student_id))
+    writer.max_batch = 3
+
+    assert writer.flush()
+    assert [row['student_id'] for row in table.rows] == list(range(7))
+    assert table.calls == 3
+    assert writer.stats()['flushed'] == 7
+    assert writer.stats()['queued'] == 0
+
+
+def test_duplicate_while_pending(table, make_writer):
+    writer = make_writer(table.write_batch)
+
+    assert writer.submit(completion(1)) == CompletionWriter.QUEUED
+    assert writer.submit(completion(1)) == CompletionWriter.DUPLICATE
+    assert writer.submit(completion(1, exercise_id=2)) == CompletionWriter.QUEUED
+    assert writer.pending_students(1) == {1}
+
+    writer.flush()
+
+    assert len(table.rows) == 2
+    assert writer.pending_students(1) == set()
+    assert not writer.is_pending(1, 1)
+
+
+def test_full_queue(table, make_writer):
+    writer = make_writer(table.write_batch, max_queue=2)
+
+    assert writer.submit(completion(1)) == CompletionWriter.QUEUED
+    assert writer.submit(completion(2)) == CompletionWriter.QUEUED
+    assert writer.submit(completion(3)) == CompletionWriter.FULL
+
+
+def test_failed_batch_falls_back_to_single_rows(make_writer):
+    table = FakeTable(bad_exercises={99})
+    writer = make_writer(table.write_batch)
+    writer.submit(completion(1))
+    writer.submit(completion(2, exercise_id=99))
+    writer.submit(completion(3))
+
+    # The bad row is put back for a retry; the rows around it are written
+    assert not writer.flush()
+    assert [row['student_id'] for row in table.rows] == [1, 3]
+    assert writer.is_pending(2, 99)
+    assert writer.stats()['queued'] == 1
+    assert writer.stats()['failed_batches'] == 1
+
+
+def test_failing_row_dropped_after_max_retries(make_writer):
+    table = FakeTable(bad_exercises={99})
+    dropped = []
+    writer = make_writer(table.write_batch, max_retries=2, on_dropped=dropped.extend)
+    writer.submit(completion(1, exercise_id=99))
+
+    assert not writer.flush()
+    assert not writer.flush()
+    assert writer.flush()
+
+    assert dropped == [completion(1, exercise_id=99)]
+    assert not writer.is_pending(1, 99)
+    assert writer.stats()['dropped'] == 1
+    assert writer.stats()['queued'] == 0
+
+    # Rows queued afterwards are not held back
+    writer.submit(completion(2))
+    assert writer.flush()
+    assert [row['student_id'] for row in table.rows] == [2]
+
+
+def test_stop_flushes_remaining_rows(table, make_writer):
+    writer = make_writer(table.write_batch)
+    writer.submit(completion(1))
+    writer.submit(completion(2))
+
+    writer.stop()
+
+    assert [row['student_id'] for row in table.rows] == [1, 2]
+    assert writer.submit(completion(3)) == CompletionWriter.FULL
+
+
+def test_stop_drops_failing_rows_and_keeps_the_rest(make_writer):
+    table = FakeTable(bad_exercises={99})
+    dropped = []
+    writer = make_writer(table.write_batch, on_dropped=dropped.extend)
+    writer.submit(completion(1))
+    writer.submit(completion(2, exercise_id=99))
+
+    writer.stop()
+
+    assert [row['student_id'] for row in table.rows] == [1]
+    assert [row['student_id'] for row in dropped] == [2]
+    assert writer.stats()['queued'] == 0
+
+
+def test_on_written_gets_only_written_rows(make_writer):
+    table = FakeTable(bad_exercises={99})
+    written = []
+    writer = make_writer(table.write_batch, on_written=written.append)
+    writer.submit(completion(1))
+    writer.submit(completion(2, exercise_id=99))
+
+    assert written == []
+    writer.flush()
+
+    assert written == [[completion(1)]]
@@ -0,0 +1,55 @@
+import bcrypt
+import pytest
+
+import app as app_module
+from rate_limit import TokenBucketLimiter
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, 'login_limiter', TokenBucketLimiter(capacity=3, rate=1 / 60))
+    monkeypatch.setattr(app_module, 'failed_login_limiter', TokenBucketLimiter(capacity=5, rate=1 / 3600))
+    app_module.admin_cache.clear()
+    if not app_module.repo.admins.get_by_username('admin'):
+        app_module.repo.admins.create('admin', bcrypt.hashpw(b'secret', bcrypt.gensalt(rounds=4)).decode())
+    return app_module.app.test_client()
+
+
+def login(client, password, ip, remote_addr='10.0.0.1'):
+    return client.post('/api/login', json={'username': 'admin', 'password': password},
+                       headers={'X-Forwarded-For': ip}, environ_base={'REMOTE_ADDR': remote_addr})
+
+
+def test_failures_from_many_ips_are_throttled_per_username(client):
+    for i in range(5):
+        assert login(client, 'wrong', f'203.0.113.{i}').status_code == 401
+
+    response = login(client, 'wrong', '203.0.113.99')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    # The right password is refused too until the bucket refills
+    assert login(client, 'secret', '198.51.100.1').status_code == 429
+
+
+def test_clients_behind_one_proxy_have_separate_ip_buckets(client):
+    for _ in range(3):
+        assert login(client, 'wrong', '203.0.113.1').status_code == 401
+    assert login(client, 'wrong', '203.0.113.1').status_code == 429
+
+    assert login(client, 'secret', '203.0.113.2').status_code == 200
+
+
+def test_successful_logins_do_not_charge_the_username_bucket(client):
+    for i in range(10):
+        assert login(client, 'secret', f'203.0.113.{i}').status_code == 200
+    assert app_module.failed_login_limiter.stats()['rejected'] == 0
+
+
+def test_wait_does_not_take_a_token():
+    limiter = TokenBucketLimiter(capacity=1, rate=1 / 60)
+
+    assert limiter.wait('key') == 0
+    assert limiter.wait('key') == 0
+    assert limiter.take('key') == 0
+    assert limiter.wait('key') > 0
+    assert limiter.stats()['rejected'] == 1
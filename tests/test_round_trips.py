@@ -0,0 +1,43 @@
+import httpx
+import pytest
+
+from repositories.http_pool import RetryTransport
+from repositories.round_trips import round_trips
+from repositories.sqlite_backend import SQLiteDatabase, SQLiteRepository
+
+
+@pytest.fixture
+def trips():
+    seen = []
+
+    def listener(backend, seconds):
+        seen.append(backend)
+
+    round_trips.add_listener(listener)
+    yield seen
+    round_trips.remove_listener(listener)
+
+
+def test_sqlite_counts_statements_and_locked_operations_once(trips):
+    repo = SQLiteRepository(SQLiteDatabase())
+    class_id = repo.classes.create('Class', 'C1', '2024-01-01')['id']
+    repo.students.create_many(class_id, [{'name': f'S{i}', 'email': f's{i}@example.com'} for i in range(3)])
+    trips.clear()
+
+    repo.students.roster(class_id)
+    assert trips == ['sqlite']
+
+    # Several statements under one lock, like a single Supabase request
+    repo.classes.delete(class_id)
+    assert trips == ['sqlite', 'sqlite']
+
+
+def test_retry_transport_counts_every_attempt(trips):
+    statuses = iter([503, 503, 200])
+    transport = RetryTransport(httpx.MockTransport(lambda request: httpx.Response(next(statuses))),
+                               retries=2, backoff=0)
+
+    with httpx.Client(transport=transport) as client:
+        assert client.get('http://supabase.test/rest/v1/student').status_code == 200
+
+    assert trips == ['supabase'] * 3
@@ -0,0 +1,124 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from repositories.supabase_backend import (
+    SupabaseAsyncRepository, SupabaseRepository, READ_PAGE_SIZE
+)
+
+MAX_ROWS = 1000
+
+
+class FakeQuery:
+    """A PostgREST select over in-memory rows that, like the server, returns
+    at most MAX_ROWS rows per request"""
+
+    def __init__(self, client, rows):
+        self.client = client
+        self.rows = rows
+        self.row_limit = None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.rows = [r for r in self.rows if r[column] == value]
+        return self
+
+    def gt(self, column, value):
+        self.rows = [r for r in self.rows if r[column] > value]
+        return self
+
+    def order(self, column):
+        self.rows = sorted(self.rows, key=lambda r: r[column])
+        return self
+
+    def limit(self, row_limit):
+        self.row_limit = row_limit
+        return self
+
+    def result(self):
+        self.client.requests += 1
+        return SimpleNamespace(data=self.rows[:min(MAX_ROWS, self.row_limit or MAX_ROWS)])
+
+    def execute(self):
+        return self.result()
+
+
+class AsyncFakeQuery(FakeQuery):
+    async def execute(self):
+        return self.result()
+
+
+class FakeClient:
+    query_class = FakeQuery
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.requests = 0
+
+    def table(self, name):
+        return self.query_class(self, list(self.tables[name]))
+
+
+class AsyncFakeClient(FakeClient):
+    query_class = AsyncFakeQuery
+
+
+STUDENTS = 1500
+
+
+@pytest.fixture
+def tables():
+    students = [{'id': i, 'class_id': 1, 'name': f'Student {i}', 'email': f's{i}@example.com'}
+                for i in range(1, STUDENTS + 1)]
+    students.append({'id': STUDENTS + 1, 'class_id': 2, 'name': 'Other', 'email': 'other@example.com'})
+    completions = [{'id': i, 'exercise_id': 1, 'student_id': i, 'student_email': f's{i}@example.com',
+                    'completed_at': '2024-01-01T00:00:00Z', 'student': {'name': f'Student {i}'}}
+                   for i in range(1, STUDENTS + 1)]
+    exercises = [{'id': i, 'class_id': 1, 'name': f'Lab {i}', 'qr_token': f'token-{i}'}
+                 for i in range(1, STUDENTS + 1)]
+    return {'student': students, 'completion': completions, 'exercise': exercises}
+
+
+def test_roster_reads_past_max_rows(tables):
+    client = FakeClient(tables)
+
+    roster = SupabaseRepository(client).students.roster(1)
+
+    assert [s['id'] for s in roster] == list(range(1, STUDENTS + 1))
+    assert client.requests == -(-STUDENTS // READ_PAGE_SIZE)
+
+
+def test_async_roster_reads_past_max_rows(tables):
+    client = AsyncFakeClient(tables)
+
+    roster = asyncio.run(SupabaseAsyncRepository(client).students.roster(1))
+
+    assert [s['id'] for s in roster] == list(range(1, STUDENTS + 1))
+    assert client.requests == -(-STUDENTS // READ_PAGE_SIZE)
+
+
+def test_list_for_exercise_without_limit_reads_every_page(tables):
+    completions = SupabaseRepository(FakeClient(tables)).completions
+
+    assert [c['id'] for c in completions.list_for_exercise(1)] == list(range(1, STUDENTS + 1))
+    assert [c['id'] for c in completions.list_for_exercise(1, after=200)] == list(range(201, STUDENTS + 1))
+    # An explicit limit is still a single page
+    assert [c['id'] for c in completions.list_for_exercise(1, after=10, limit=5)] == list(range(11, 16))
+
+
+def test_async_list_for_exercise_without_limit_reads_every_page(tables):
+    completions = SupabaseAsyncRepository(AsyncFakeClient(tables)).completions
+
+    rows = asyncio.run(completions.list_for_exercise(1))
+
+    assert [c['id'] for c in rows] == list(range(1, STUDENTS + 1))
+    assert rows[-1]['student_name'] == f'Student {STUDENTS}'
+
+
+def test_exercise_list_for_class_reads_past_max_rows(tables):
+    exercises = SupabaseRepository(FakeClient(tables)).exercises.list_for_class(1)
+
+    assert [e['id'] for e in exercises] == list(range(1, STUDENTS + 1))
@@ -0,0 +1,44 @@
+"""
+Per-key data versions for conditional GETs.
+
+Write paths `bump()` the keys whose data they change. Read endpoints build a
+weak ETag from `etag()` and can answer `If-None-Match` with a 304 without
+querying the backend.
+
+Versions live in this process only. Tags carry a per-process epoch, so a
+tag issued by another worker or before a restart never matches here.
+Entries also expire after `ttl` seconds, so a write that another worker
+handled is seen within that time, as with the roster and exercise caches.
+Within that window a worker that missed a write still answers 304 to its
+own old tags, so a client drops its cached copies after each of its own
+writes (forgetETags in admin.html) instead of revalidating them.
+"""
+
+import itertools
+import secrets
+
+from cache import LRUCache
+
+
+class DataVersions:
+    def __init__(self, maxsize=4096, ttl=None):
+        self._epoch = secrets.token_hex(4)
+        self._counter = itertools.count(1)
+        self._versions = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def _next(self):
+        return f'{self._epoch}.{next(self._counter)}'
+
+    def current(self, key):
+        return self._versions.get_or_set(key, self._next)
+
+    def bump(self, *keys):
+        for key in keys:
+            self._versions.set(key, self._next())
+
+    def etag(self, *keys):
+        """Opaque tag that changes whenever any of the keys is bumped"""
+        return '-'.join(self.current(key) for key in keys)
+
+    def stats(self):
+        return self._versions.stats()
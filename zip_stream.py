@@ -0,0 +1,50 @@
+"""
+Incremental ZIP writer for streamed downloads.
+
+`ZipStream` writes entries into an in-memory buffer that is drained after
+every chunk, so an archive of any size can be sent from a generator while
+holding only the chunk being compressed. The archive is written without
+seeking (sizes go in data descriptors), which every unzip tool reads.
+"""
+
+import zipfile
+
+
+class _DrainableBuffer:
+    """Write-only file object whose contents are taken with drain()"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStream:
+    def __init__(self, compression=zipfile.ZIP_DEFLATED):
+        self._buffer = _DrainableBuffer()
+        self._zip = zipfile.ZipFile(self._buffer, 'w', compression=compression)
+
+    def write_file(self, name, chunks):
+        """Add an entry from an iterable of bytes, yielding archive bytes as they're produced"""
+        with self._zip.open(name, 'w', force_zip64=True) as entry:
+            for chunk in chunks:
+                entry.write(chunk)
+                data = self._buffer.drain()
+                if data:
+                    yield data
+        yield self._buffer.drain()
+
+    def close(self):
+        """Finish the archive and return its remaining bytes (the central directory)"""
+        self._zip.close()
+        return self._buffer.drain()